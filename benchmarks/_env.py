@@ -0,0 +1,19 @@
+"""
+与 tests/conftest.py 相同的环境：settings.template.toml 和临时目录，不需要 MySQL。必须在导入任何项目模块之前导入。
+"""
+import os
+import pathlib
+import sqlite3
+import sys
+import tempfile
+
+import ulid
+
+ROOT = pathlib.Path(__file__).parent.parent
+TEMP_DIR = pathlib.Path(tempfile.mkdtemp(prefix="rdfz3d-bench-"))
+
+os.environ.setdefault("RDFZ3D_SETTINGS", str(ROOT / "settings.template.toml"))
+os.environ.setdefault("DATABASE_URI", f"sqlite+aiosqlite:///{TEMP_DIR / 'bench.sqlite3'}")
+os.environ.setdefault("GAME_SERVER_STATUS_SNAPSHOT_PATH", str(TEMP_DIR / "game_server_status.json"))
+sys.path.insert(0, str(ROOT / "src"))
+sqlite3.register_adapter(ulid.ULID, str)
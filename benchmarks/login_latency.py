@@ -0,0 +1,96 @@
+"""
+登录延迟基准：一批用户同时登录时，登录和游戏服务器心跳各自的 p50 / p99 延迟，
+对比在 ``PasswordHashPool`` 中计算哈希与直接在事件循环中计算。
+
+心跳以固定间隔在同一事件循环中调用 ``status.crud.report_server_status``，延迟为实际完成时间与计划时间之差，
+即事件循环被阻塞的时长。
+
+    python benchmarks/login_latency.py [--users 40] [--logins 4] [--heartbeat-interval 0.002]
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import _env
+
+import httpx
+
+import main
+import universal.database
+import user.users
+from game_server.status import common, crud, schemas
+
+
+def _percentiles(samples: list[float]) -> tuple[float, float]:
+    """:return: (p50, p99) in milliseconds"""
+    quantiles = statistics.quantiles(samples, n=100)
+    return quantiles[49] * 1000, quantiles[98] * 1000
+
+
+async def _heartbeats(interval: float, stop: asyncio.Event, delays: list[float]) -> None:
+    report = schemas.GameServerReport(state=common.GameServerStateEnum.RUNNING, player_count=1)
+    due = time.perf_counter()
+    game_server_id = 0
+    while not stop.is_set():
+        due += interval
+        await asyncio.sleep(max(due - time.perf_counter(), 0))
+        crud.report_server_status(game_server_id % 1000, report)
+        delays.append(time.perf_counter() - due)
+        game_server_id += 1
+
+
+async def _login(client: httpx.AsyncClient, username: str, latencies: list[float]) -> None:
+    start = time.perf_counter()
+    response = await client.post("/auth/login", json={"username": username, "password": "benchmark-password"})
+    response.raise_for_status()
+    latencies.append(time.perf_counter() - start)
+
+
+async def run(client: httpx.AsyncClient, usernames: list[str], logins: int, interval: float) \
+        -> tuple[list[float], list[float]]:
+    stop = asyncio.Event()
+    delays = []
+    heartbeat_task = asyncio.create_task(_heartbeats(interval, stop, delays))
+    latencies = []
+    for _ in range(logins):
+        # 整班同时登录
+        await asyncio.gather(*(_login(client, username, latencies) for username in usernames))
+    stop.set()
+    await heartbeat_task
+    return latencies, delays
+
+
+async def bench(users: int, logins: int, interval: float) -> None:
+    universal.database.engine.echo = False
+    await universal.database.create_db_and_tables()
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        usernames = [f"bench_{i}_{time.monotonic_ns()}" for i in range(users)]
+        for username in usernames:
+            response = await client.post("/user/register",
+                                         json={"username": username, "password": "benchmark-password"})
+            response.raise_for_status()
+        pool = user.users.UserManager.password_hash_pool
+        print(f"{users} users logging in at once, {logins} rounds, heartbeat every {interval * 1000:g} ms")
+        print(f"{'hashing':>12} {'login p50':>10} {'login p99':>10} {'beat p50':>9} {'beat p99':>9}  (ms)")
+        for name, hash_pool in (("event loop", None), ("pool", pool)):
+            user.users.UserManager.password_hash_pool = hash_pool
+            latencies, delays = await run(client, usernames, logins, interval)
+            login_p50, login_p99 = _percentiles(latencies)
+            beat_p50, beat_p99 = _percentiles(delays)
+            print(f"{name:>12} {login_p50:>10.1f} {login_p99:>10.1f} {beat_p50:>9.2f} {beat_p99:>9.2f}")
+        user.users.UserManager.password_hash_pool = pool
+
+
+def main_() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=40)
+    parser.add_argument("--logins", type=int, default=4, help="rounds of logins, at most the login burst")
+    parser.add_argument("--heartbeat-interval", type=float, default=0.002)
+    args = parser.parse_args()
+    asyncio.run(bench(args.users, args.logins, args.heartbeat_interval))
+
+
+if __name__ == "__main__":
+    main_()
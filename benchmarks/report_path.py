@@ -0,0 +1,78 @@
+"""
+上报路径的微基准：在已有 N 台服务器上报的状态存储中，每次上报和每次过期的平均耗时。
+每次上报的耗时应与 N 无关（O(1) 写入，O(log n) 过期）。
+
+    python benchmarks/report_path.py [--backend memory|sqlite] [--reports 20000]
+"""
+import argparse
+import datetime
+import time
+
+import _env
+
+from game_server.status import common, crud, events, history, ranking, aggregates, store, waiters
+
+SIZES = (10, 100, 1_000, 10_000, 100_000)
+
+
+def _reset(backend: str) -> None:
+    """A fresh worker: empty store and indexes."""
+    if backend == "memory":
+        crud.status_store = store.MemoryStatusStore()
+    else:
+        path = _env.TEMP_DIR / f"status-{time.monotonic_ns()}.sqlite3"
+        crud.status_store = store.SQLiteStatusStore(path)
+    crud.broadcaster = events.StatusBroadcaster()
+    crud.history_store = history.HistoryStore()
+    crud.load_index = ranking.LoadIndex()
+    crud.status_aggregates = aggregates.StatusAggregates()
+    crud.generation_waiters = waiters.GenerationWaiters()
+    crud.expiry_timer.notify = lambda deadline: None
+
+
+def _report(player_count: int) -> crud.schemas.GameServerReport:
+    return crud.schemas.GameServerReport(state=common.GameServerStateEnum.RUNNING, player_count=player_count,
+                                         max_player_count=100)
+
+
+def measure(backend: str, servers: int, reports: int) -> tuple[float, float, float]:
+    """
+    :return: microseconds per unchanged report (fast path), per changed report, per expiry
+    """
+    _reset(backend)
+    for game_server_id in range(servers):
+        crud.report_server_status(game_server_id, _report(0))
+    same = _report(0)
+    start = time.perf_counter()
+    for i in range(reports):
+        crud.report_server_status(i % servers, same)
+    fast = (time.perf_counter() - start) / reports
+    changed = [_report(player_count) for player_count in range(1, 51)]
+    start = time.perf_counter()
+    for i in range(reports):
+        crud.report_server_status(i % servers, changed[i % 50])
+    full = (time.perf_counter() - start) / reports
+    # 让所有状态同时过期
+    later = datetime.datetime.now() + datetime.timedelta(hours=1)
+    start = time.perf_counter()
+    expired = crud.status_store.expire(later)
+    for game_server_id in expired:
+        crud._on_stopped(game_server_id)
+    expiry = (time.perf_counter() - start) / max(len(expired), 1)
+    return fast * 1e6, full * 1e6, expiry * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--backend", choices=("memory", "sqlite"), default="memory")
+    parser.add_argument("--reports", type=int, default=20_000)
+    args = parser.parse_args()
+    print(f"backend={args.backend}, {args.reports} reports per size, microseconds per operation")
+    print(f"{'servers':>8} {'fast path':>10} {'changed':>10} {'expiry':>10}")
+    for servers in SIZES:
+        fast, full, expiry = measure(args.backend, servers, args.reports)
+        print(f"{servers:>8} {fast:>10.2f} {full:>10.2f} {expiry:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
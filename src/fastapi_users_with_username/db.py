@@ -1,4 +1,4 @@
-from typing import TYPE_CHECKING, Optional
+from typing import TYPE_CHECKING, Any, Optional
 
 import fastapi_users_db_sqlmodel.access_token
 import sqlalchemy.sql.schema
@@ -39,6 +39,8 @@ class SQLModelBaseUserDB(sqlmodel.SQLModel):
     is_verified: bool = sqlmodel.Field(False, nullable=False)
     is_email_verified: bool = sqlmodel.Field(False, nullable=False)
     is_phone_verified: bool = sqlmodel.Field(False, nullable=False)
+    version: int = sqlmodel.Field(default=0, nullable=False, sa_column_kwargs={"server_default": "0"})
+    """每次通过 ``SQLModelUserDatabaseAsync.update`` 修改时加一，用于 ETag"""
 
     class Config:
         orm_mode = True
@@ -50,11 +52,28 @@ class SQLModelBaseAccessToken(fastapi_users_db_sqlmodel.access_token.SQLModelBas
 
 
 class SQLModelUserDatabaseAsync(fastapi_users_db_sqlmodel.SQLModelUserDatabaseAsync):
+    async def update(self, user: models.UP, update_dict: dict[str, Any]) -> models.UP:
+        """
+        Update a user, bumping its version in SQL (``version = version + 1``): ``user`` may be a cached snapshot
+        that is older than the row, so its own ``version`` cannot be trusted.
+        """
+        return await super().update(user, update_dict | {"version": self.user_model.version + 1})
+
+    @staticmethod
+    def normalize_email(email: str) -> str:
+        """:raises PydanticCustomError: not an email"""
+        return pydantic.networks.validate_email(email)[1].lower()
+
+    @staticmethod
+    def normalize_phone_no(phone_no: str) -> str:
+        """:raises phonenumbers.NumberParseException: not a phone number"""
+        return phonenumbers.format_number(phonenumbers.parse(phone_no, PhoneNumber.default_region_code),
+                                          getattr(phonenumbers.PhoneNumberFormat, PhoneNumber.phone_format))
+
     async def get_by_email(self, email: str) -> Optional[models.UP]:
         """Get a single user by email."""
-        email = pydantic.networks.validate_email(email)[1]
         statement = sqlmodel.select(self.user_model).where(  # type: ignore
-            func.lower(self.user_model.email) == func.lower(email)
+            func.lower(self.user_model.email) == self.normalize_email(email)
         )
         results = await self.session.execute(statement)
         obj = results.first()
@@ -64,10 +83,8 @@ class SQLModelUserDatabaseAsync(fastapi_users_db_sqlmodel.SQLModelUserDatabaseAs
 
     async def get_by_phone_no(self, phone_no: str) -> Optional[models.UP]:
         """Get a single user by phone number."""
-        phone_no = phonenumbers.format_number(phonenumbers.parse(phone_no, PhoneNumber.default_region_code),
-                                              getattr(phonenumbers.PhoneNumberFormat, PhoneNumber.phone_format))
         statement = sqlmodel.select(self.user_model).where(
-            self.user_model.phone_no == phone_no
+            self.user_model.phone_no == self.normalize_phone_no(phone_no)
         )
         results = await self.session.execute(statement)
         obj = results.first()
@@ -88,19 +105,31 @@ class SQLModelUserDatabaseAsync(fastapi_users_db_sqlmodel.SQLModelUserDatabaseAs
         return obj[0]
 
     async def get_by_any_identifier(self, identifier: str):
-        """Get a single user by username or email or phone number."""
+        """
+        Get a single user by username or email or phone number, in one query.
+        An identifier that is both a username and a phone number matches the username first.
+        Compares ``lower(column)`` with a lowercase parameter, so that the functional indexes (see ``user.db``) are used.
+        """
+        conditions = []
+        username = None
         if '@' in identifier:
             try:
-                return await self.get_by_email(identifier)
+                conditions.append(func.lower(self.user_model.email) == self.normalize_email(identifier))
             except PydanticCustomError:
                 return None
-        elif re.match(r'[+\-]', identifier):
-            try:
-                return await self.get_by_phone_no(identifier)
-            except phonenumbers.NumberParseException:
-                return None
         else:
+            if not re.match(r'[+\-]', identifier):
+                username = identifier.strip().lower()
+                conditions.append(func.lower(self.user_model.username) == username)
             try:
-                return await self.get_by_username(identifier) or await self.get_by_phone_no(identifier)
+                conditions.append(self.user_model.phone_no == self.normalize_phone_no(identifier))
             except phonenumbers.NumberParseException:
-                return None
+                pass
+        if not conditions:
+            return None
+        statement = sqlmodel.select(self.user_model).where(sqlmodel.or_(*conditions)).limit(2)
+        users = (await self.session.execute(statement)).scalars().all()
+        for user in users:
+            if username is not None and user.username.lower() == username:
+                return user
+        return users[0] if users else None
@@ -18,3 +18,6 @@ class InvalidUsernameException(fastapi_users.exceptions.FastAPIUsersException):
 class WrongPassword(fastapi_users.exceptions.FastAPIUsersException):
     pass
 
+
+class PasswordHashingBusy(fastapi_users.exceptions.FastAPIUsersException):
+    """Too many password hashes are queued, see ``hashing.PasswordHashPool``."""
@@ -1,6 +1,7 @@
-from typing import Type, Optional
+from typing import Type, Optional, Sequence
 
 import fastapi
+import fastapi.params
 import fastapi_users.authentication
 
 from . import schemas, router, models
@@ -34,6 +35,7 @@ class FastAPIUsers(fastapi_users.FastAPIUsers[models.UP, fastapi_users.models.ID
             requires_verification: bool = False,
             login_description: Optional[str] = None,
             logout_description: Optional[str] = None,
+            login_dependencies: Optional[Sequence[fastapi.params.Depends]] = None,
     ) -> fastapi.APIRouter:
         """
         Return an auth router for a given authentication backend.
@@ -44,6 +46,7 @@ class FastAPIUsers(fastapi_users.FastAPIUsers[models.UP, fastapi_users.models.ID
         :param login_description: Description to put in login's doc.
         :param logout_description: Description to put in logout's doc.
         require the user to be verified or not. Defaults to False.
+        :param login_dependencies: Dependencies of the login route only, e.g. rate limiting.
         """
         return router.get_auth_router(
             backend,
@@ -53,6 +56,7 @@ class FastAPIUsers(fastapi_users.FastAPIUsers[models.UP, fastapi_users.models.ID
             requires_verification,
             login_description,
             logout_description,
+            login_dependencies,
         )
 
     def get_users_extra_router(
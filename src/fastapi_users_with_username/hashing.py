@@ -0,0 +1,49 @@
+import asyncio
+import concurrent.futures
+import threading
+from typing import Callable, TypeVar
+
+from . import exceptions
+
+T = TypeVar("T")
+
+
+class PasswordHashPool:
+    """
+    Runs password hashing, tens of milliseconds of CPU each, in dedicated threads instead of on the event loop
+    (argon2 and bcrypt release the GIL). At most ``max_pending`` calls may be running or queued; more fail at once
+    with ``PasswordHashingBusy`` rather than queueing up behind a burst of logins.
+
+    A slot is released when the hash finishes in its thread, not when the awaiting request returns: a request
+    cancelled (client gone) while its hash runs still holds the slot until the hash is done. A hash still queued
+    is cancelled with its request.
+    """
+
+    def __init__(self, max_workers: int, max_pending: int):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers, thread_name_prefix="password-hash")
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    async def run(self, function: Callable[..., T], *args) -> T:
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise exceptions.PasswordHashingBusy()
+            self._pending += 1
+        try:
+            future = self._executor.submit(function, *args)
+        except BaseException:
+            self._release()
+            raise
+        future.add_done_callback(self._release)
+        return await asyncio.wrap_future(future)
+
+    def _release(self, _: object = None) -> None:
+        # 在线程池的线程中调用
+        with self._lock:
+            self._pending -= 1
@@ -1,16 +1,36 @@
 from typing import Optional, Union, Any
 import fastapi.security
 import fastapi_users
+import fastapi_users.authentication
 import fastapi_users.jwt
 import jwt.exceptions
 import ulid
 from fastapi import Request
 
-from . import models, db, schemas, common, exceptions
+from . import models, db, schemas, common, exceptions, hashing
 
 
 class BaseUserManager(fastapi_users.BaseUserManager[models.UP, fastapi_users.models.ID]):
     user_db: db.SQLModelUserDatabaseAsync
+    password_hash_pool: Optional[hashing.PasswordHashPool] = None
+    """不为 None 时，在此线程池中计算密码哈希，不阻塞事件循环"""
+
+    async def hash_password(self, password: str) -> str:
+        if self.password_hash_pool is None:
+            return self.password_helper.hash(password)
+        return await self.password_hash_pool.run(self.password_helper.hash, password)
+
+    async def verify_and_update_password(self, password: str, hashed_password: str) -> tuple[bool, Optional[str]]:
+        if self.password_hash_pool is None:
+            return self.password_helper.verify_and_update(password, hashed_password)
+        return await self.password_hash_pool.run(self.password_helper.verify_and_update, password, hashed_password)
+
+    async def write_login_token(self, strategy: fastapi_users.authentication.Strategy[models.UP, fastapi_users.models.ID],
+                                user: models.UP, credentials: schemas.UL) -> str:
+        """
+        Write the token of a login. Override to store more about the login along with the token.
+        """
+        return await strategy.write_token(user)
 
     async def get_by_username(self, username: str):
         user = await self.user_db.get_by_username(username)
@@ -71,7 +91,7 @@ class BaseUserManager(fastapi_users.BaseUserManager[models.UP, fastapi_users.mod
             else user_create.create_update_dict_superuser()
         )
         password = user_dict.pop("password")
-        user_dict["hashed_password"] = self.password_helper.hash(password)
+        user_dict["hashed_password"] = await self.hash_password(password)
 
         created_user = await self.user_db.create(user_dict)
 
@@ -96,10 +116,10 @@ class BaseUserManager(fastapi_users.BaseUserManager[models.UP, fastapi_users.mod
         except fastapi_users.exceptions.UserNotExists:
             # Run the hasher to mitigate timing attack
             # Inspired from Django: https://code.djangoproject.com/ticket/20760
-            self.password_helper.hash(credentials.password)
+            await self.hash_password(credentials.password)
             return None
 
-        verified, updated_password_hash = self.password_helper.verify_and_update(
+        verified, updated_password_hash = await self.verify_and_update_password(
             credentials.password, user.hashed_password
         )
         if not verified:
@@ -217,7 +237,7 @@ class BaseUserManager(fastapi_users.BaseUserManager[models.UP, fastapi_users.mod
                     validated_update_dict["phone_no"] = value
             elif field == "password" and value is not None:
                 await self.validate_password(value, user)
-                validated_update_dict["hashed_password"] = self.password_helper.hash(value)
+                validated_update_dict["hashed_password"] = await self.hash_password(value)
             else:
                 validated_update_dict[field] = value
         return await self.user_db.update(user, validated_update_dict)
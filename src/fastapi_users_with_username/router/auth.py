@@ -1,6 +1,7 @@
-from typing import Optional
+from typing import Optional, Sequence
 
 import fastapi
+import fastapi.params
 
 import fastapi_users.authentication, fastapi_users.openapi, fastapi_users.router
 from .. import schemas
@@ -14,6 +15,7 @@ def get_auth_router(
         requires_verification: bool = False,
         login_description: Optional[str] = None,
         logout_description: Optional[str] = None,
+        login_dependencies: Optional[Sequence[fastapi.params.Depends]] = None,
 ) -> fastapi.APIRouter:
     """Generate a router with login/logout routes for an authentication backend."""
     router = fastapi.APIRouter()
@@ -47,6 +49,7 @@ def get_auth_router(
         name=f"auth:{backend.name}.login",
         responses=login_responses,
         description=login_description,
+        dependencies=login_dependencies,
     )
     async def login(
             request: fastapi.Request,
@@ -68,7 +71,8 @@ def get_auth_router(
                 status_code=fastapi.status.HTTP_400_BAD_REQUEST,
                 detail=fastapi_users.router.common.ErrorCode.LOGIN_USER_NOT_VERIFIED,
             )
-        response = await backend.login(strategy, user)
+        token = await user_manager.write_login_token(strategy, user, credentials)
+        response = await backend.transport.get_login_response(token)
         await user_manager.on_after_login(user, request, response)
         return response
 
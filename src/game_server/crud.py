@@ -1,3 +1,5 @@
+import collections
+import time
 from typing import Optional, AsyncGenerator, Iterable
 
 import sqlalchemy.exc
@@ -5,10 +7,19 @@ import sqlmodel
 from sqlmodel.ext.asyncio.session import AsyncSession
 
 import fastapi_users_with_username
+import universal.database
+import universal.etag
 
 from . import models, schemas, exceptions
 from . import status
 
+REPORTER_HOST_CACHE_SIZE = 65536
+REPORTER_HOST_CACHE_TTL = 60.0
+"""其他 worker 修改后，本 worker 的缓存最多在这么多秒后过期"""
+
+# id -> (exists, reporter_host, expires_at)
+reporter_host_cache: collections.OrderedDict[int, tuple[bool, Optional[str], float]] = collections.OrderedDict()
+
 
 async def get_game_server(db_session: AsyncSession,
                           game_server_id: int,
@@ -57,6 +68,67 @@ async def get_game_server_by_address(db_session: AsyncSession,
         return None
 
 
+async def get_reporter_host(game_server_id: int) -> tuple[bool, Optional[str]]:
+    """
+    Get whether a game server exists and its reporter host, from ``reporter_host_cache`` if possible.
+    Only opens a DB session on a cache miss.
+    :param game_server_id:
+    :return: (exists, reporter_host)
+    """
+    return (await get_reporter_hosts([game_server_id]))[game_server_id]
+
+
+async def get_reporter_hosts(game_server_ids: Iterable[int]) -> dict[int, tuple[bool, Optional[str]]]:
+    """
+    Like ``get_reporter_host``, for many servers at once. All cache misses are loaded with a single query.
+    :param game_server_ids:
+    :return: game_server_id -> (exists, reporter_host)
+    """
+    result = {}
+    missing = []
+    for game_server_id in game_server_ids:
+        cached = peek_reporter_host(game_server_id)
+        if cached is None:
+            missing.append(game_server_id)
+        else:
+            result[game_server_id] = cached
+    if not missing:
+        return result
+    async with AsyncSession(universal.database.engine) as db_session:
+        statement = (sqlmodel.select(models.GameServer.id, models.GameServer.reporter_host, models.GameServer.admin_id)
+                     .where(models.GameServer.id.in_(missing)))
+        found = {}
+        for game_server_id, reporter_host, admin_id in (await db_session.exec(statement)).all():
+            found[game_server_id] = reporter_host
+            status.crud.set_admin(game_server_id, admin_id)
+    expires_at = time.monotonic() + REPORTER_HOST_CACHE_TTL
+    for game_server_id in missing:
+        reporter_host = found.get(game_server_id)
+        result[game_server_id] = (reporter_host is not None, reporter_host)
+        reporter_host_cache[game_server_id] = (reporter_host is not None, reporter_host, expires_at)
+        reporter_host_cache.move_to_end(game_server_id)
+    while len(reporter_host_cache) > REPORTER_HOST_CACHE_SIZE:
+        reporter_host_cache.popitem(last=False)
+    return result
+
+
+def peek_reporter_host(game_server_id: int) -> Optional[tuple[bool, Optional[str]]]:
+    """
+    Like ``get_reporter_host``, but only looks at the cache.
+    :param game_server_id:
+    :return: (exists, reporter_host), or None on a cache miss
+    """
+    cached = reporter_host_cache.get(game_server_id)
+    if cached is None or cached[2] <= time.monotonic():
+        return None
+    reporter_host_cache.move_to_end(game_server_id)
+    return cached[0], cached[1]
+
+
+def invalidate_reporter_host(game_server_id: int) -> None:
+    reporter_host_cache.pop(game_server_id, None)
+
+
 async def create_game_server(db_session: AsyncSession,
                              creator: Optional[fastapi_users_with_username.models.UP],
                              game_server_create: schemas.GameServerCreate,
@@ -72,27 +144,139 @@ async def create_game_server(db_session: AsyncSession,
     game_server_model = models.GameServer.model_validate(info)
     db_session.add(game_server_model)
     await db_session.commit()
+    invalidate_reporter_host(game_server_model.id)
     return schemas.GameServerReadAdmin.model_validate(game_server_model)
 
 
 async def read_game_servers(db_session: AsyncSession,
                             current_user: Optional[fastapi_users_with_username.models.UP],
-                            skip: int = 0, limit: int = 100) \
-        -> Iterable[schemas.GameServerReadAdmin] | Iterable[schemas.GameServerRead]:
+                            skip: int = 0, limit: int = 100,
+                            after: Optional[int] = None,
+                            running_only: bool = False,
+                            name_prefix: Optional[str] = None,
+                            admin_id: Optional[str] = None,
+                            include_detail: bool = False,
+                            include_description: bool = True,
+                            if_none_match: Optional[str] = None) \
+        -> tuple[str, Optional[list[schemas.GameServerReadAdmin] | list[schemas.GameServerRead]]]:
+    """
+    Read game servers ordered by id.
+    :param db_session:
+    :param current_user:
+    :param skip: OFFSET pagination, kept for old clients; prefer ``after``
+    :param limit:
+    :param after: keyset pagination, only servers with id greater than this
+    :param running_only: only servers that are reporting and not stopped, taken from the status store
+    :param name_prefix:
+    :param admin_id:
+    :param include_detail: ``detail`` is a LONGTEXT, so it is only loaded on request; null otherwise
+    :param include_description: null if False
+    :param if_none_match: the request's ``If-None-Match``
+    :return: (weak ETag, servers), servers being None if the ETag matches ``if_none_match``.
+        ``game_time`` advancing as predicted by the day/night lengths does not change the ETag
+    """
+    admin = current_user.is_superuser if current_user else False
+    statement = sqlmodel.select(*_listing_columns(include_detail, include_description))
+    if after is not None:
+        statement = statement.where(models.GameServer.id > after)
+    if running_only:
+        running_ids = status.crud.get_running_server_ids()
+        statement = statement.where(models.GameServer.id.in_(running_ids))
+    if name_prefix:
+        statement = statement.where(models.GameServer.name.startswith(name_prefix, autoescape=True))
+    if admin_id is not None:
+        statement = statement.where(models.GameServer.admin_id == admin_id)
+    statement = statement.order_by(models.GameServer.id).offset(skip).limit(limit)
+    game_servers = (await db_session.exec(statement)).all()
+    ids = [game_server.id for game_server in game_servers]
+    generations = status.crud.get_server_generations(ids)
+    # game_time 每次读取都会推算，不改变 ETag，所以是弱 ETag
+    etag = universal.etag.make_etag(admin, include_detail, include_description,
+                                    [(game_server.id, game_server.version, generations[game_server.id])
+                                     for game_server in game_servers], weak=True)
+    if universal.etag.matches(if_none_match, etag):
+        return etag, None
+    return etag, _to_listing(game_servers, admin, status.crud.get_server_statuses(ids))
+
+
+async def recommend_game_servers(db_session: AsyncSession,
+                                 current_user: Optional[fastapi_users_with_username.models.UP],
+                                 count: int = 10,
+                                 name_prefix: Optional[str] = None) \
+        -> list[schemas.GameServerReadAdmin] | list[schemas.GameServerRead]:
+    """
+    The least loaded RUNNING servers that are not full, walking ``status.crud.load_index`` in order
+    instead of sorting every server.
+    :param db_session:
+    :param current_user:
+    :param count:
+    :param name_prefix:
+    :return:
+    """
     admin = current_user.is_superuser if current_user else False
-    statement = sqlmodel.select(models.GameServer).offset(skip).limit(limit)
-    game_servers = await db_session.exec(statement)
-    return ((schemas.GameServerReadAdmin if admin else schemas.GameServerRead).model_validate(game_server)
-            for game_server in game_servers)
+    # 有筛选条件时每次多取一些，减少查询次数
+    chunk = count if not name_prefix else max(4 * count, 64)
+    game_servers = []
+    seen = set()
+    start = 0
+    while len(game_servers) < count:
+        ranked = status.crud.get_recommended_server_ids(start, start + chunk)
+        if not ranked:
+            break
+        start += chunk
+        # 两次查询之间排名可能变化，跳过已经看过的
+        ids = [game_server_id for game_server_id in ranked if game_server_id not in seen]
+        seen.update(ids)
+        statement = sqlmodel.select(*_listing_columns()).where(models.GameServer.id.in_(ids))
+        if name_prefix:
+            statement = statement.where(models.GameServer.name.startswith(name_prefix, autoescape=True))
+        found = {game_server.id: game_server for game_server in (await db_session.exec(statement)).all()}
+        game_servers.extend(found[game_server_id] for game_server_id in ids if game_server_id in found)
+    game_servers = game_servers[:count]
+    statuses = status.crud.get_server_statuses([game_server.id for game_server in game_servers])
+    return _to_listing([game_server for game_server in game_servers
+                        if statuses[game_server.id].state != status.common.GameServerStateEnum.STOPPED],
+                       admin, statuses)
+
+
+def _listing_columns(include_detail: bool = False, include_description: bool = True) -> list:
+    columns = [models.GameServer.id, models.GameServer.version, models.GameServer.address, models.GameServer.name,
+               models.GameServer.admin_id, models.GameServer.reporter_host]
+    if include_description:
+        columns.append(models.GameServer.description)
+    if include_detail:
+        columns.append(models.GameServer.detail)
+    return columns
+
+
+def _to_listing(game_servers: list, admin: bool, statuses: dict[int, status.models.GameServerStatus]) \
+        -> list[schemas.GameServerReadAdmin] | list[schemas.GameServerRead]:
+    context = {"statuses": statuses}
+    return [(schemas.GameServerReadAdmin if admin else schemas.GameServerRead).model_validate(
+        {"description": None, "detail": None, **game_server._mapping}, context=context)
+        for game_server in game_servers]
 
 
 async def read_game_server(db_session: AsyncSession,
                            current_user: Optional[fastapi_users_with_username.models.UP],
-                           game_server_id: int) \
-        -> Optional[schemas.GameServerRead | schemas.GameServerReadAdmin]:
+                           game_server_id: int,
+                           if_none_match: Optional[str] = None) \
+        -> tuple[str, Optional[schemas.GameServerRead | schemas.GameServerReadAdmin]]:
+    """
+    Read a game server.
+    :param db_session:
+    :param current_user:
+    :param game_server_id:
+    :param if_none_match: the request's ``If-None-Match``
+    :return: (weak ETag, server), server being None if the ETag matches ``if_none_match``, see ``read_game_servers``
+    """
     game_server = await get_game_server(db_session, game_server_id)
     admin = (current_user.is_superuser or game_server.admin_id == current_user.id) if current_user else False
-    return (schemas.GameServerReadAdmin if admin else schemas.GameServerRead).model_validate(game_server)
+    generation = status.crud.get_server_generations([game_server_id])[game_server_id]
+    etag = universal.etag.make_etag(admin, game_server_id, game_server.version, generation, weak=True)
+    if universal.etag.matches(if_none_match, etag):
+        return etag, None
+    return etag, (schemas.GameServerReadAdmin if admin else schemas.GameServerRead).model_validate(game_server)
 
 
 async def update_game_server(db_session: AsyncSession,
@@ -114,7 +298,9 @@ async def update_game_server(db_session: AsyncSession,
     info = game_server_update.model_dump(exclude_unset=True)
     for key, value in info.items():
         setattr(game_server, key, value)
+    game_server.version += 1
     await db_session.commit()
+    invalidate_reporter_host(game_server_id)
     return schemas.GameServerReadAdmin.model_validate(game_server)
 
 
@@ -124,4 +310,6 @@ async def delete_game_server(db_session: AsyncSession,
     game_server = await get_game_server(db_session, game_server_id, read_user, True)
     await db_session.delete(game_server)
     await db_session.commit()
+    invalidate_reporter_host(game_server_id)
+    status.crud.forget_server(game_server_id)
     return None
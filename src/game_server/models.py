@@ -14,7 +14,8 @@ class GameServerBase(sqlmodel.SQLModel):
     address: str = sqlmodel.Field(index=True, unique=True)
     name: str = sqlmodel.Field(index=True)
     description: Optional[str] = sqlmodel.Field(nullable=False, default="")
-    detail: Optional[str] = sqlmodel.Field(default=None, sa_type=LONGTEXT)
+    # MySQL 中为 LONGTEXT，其他数据库（如测试用的 SQLite）为 TEXT
+    detail: Optional[str] = sqlmodel.Field(default=None, sa_type=sqlalchemy.Text().with_variant(LONGTEXT, "mysql"))
 
 
 class GameServerPublic(GameServerBase):
@@ -27,3 +28,5 @@ class GameServer(GameServerPublic, GameServerId, table=True):
     __tablename__ = "game_server"
     id: Optional[int] = sqlmodel.Field(primary_key=True, default=None)
     reporter_host: str
+    version: int = sqlmodel.Field(default=0, nullable=False, sa_column_kwargs={"server_default": "0"})
+    """每次修改加一，用于 ETag"""
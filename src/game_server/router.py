@@ -1,4 +1,4 @@
-from typing import Optional
+from typing import Optional, Literal
 import fastapi
 from fastapi import APIRouter
 from sqlmodel.ext.asyncio.session import AsyncSession
@@ -11,6 +11,9 @@ from . import status
 
 router = APIRouter()
 
+_NOT_MODIFIED_DESCRIPTION = ("Not modified. ETag 为弱 ETag：game_time 每次读取时按 day_length / night_length 推算到当前时刻，"
+                             "只有这样推进时 ETag 不变。收到 304 时，客户端应从缓存响应的 Date 起自行推进 game_time")
+
 router.include_router(status.router)
 
 
@@ -47,33 +50,79 @@ async def create_game_server(
                                     detail={"info": "Game server already exists", "field": e.field})
 
 
-@router.get("/")
+@router.get(
+    "/",
+    description="按 id 排序。翻页时把响应头 X-Next-Cursor 作为下一页的 after；没有此响应头说明已是最后一页。"
+                "默认不返回 detail（为 null），需要时加 include=detail；完整信息见 GET /game_server/{game_server_id}。"
+                "支持 If-None-Match，未变化时返回 304。",
+    responses={
+        fastapi.status.HTTP_304_NOT_MODIFIED: {"description": _NOT_MODIFIED_DESCRIPTION},
+    },
+)
 async def get_game_servers(
-        skip: int = fastapi.Query(default=0, ge=0, description="跳过前_个"),
+        response: fastapi.Response,
+        if_none_match: Optional[str] = fastapi.Header(default=None),
+        skip: int = fastapi.Query(default=0, ge=0, description="跳过前_个（建议改用 after）"),
         limit: int = fastapi.Query(default=100, ge=1, description="返回_个"),
+        after: Optional[int] = fastapi.Query(default=None, description="只返回 id 大于_的"),
+        running: bool = fastapi.Query(default=False, description="只返回正在运行（未 stopped）的"),
+        name_prefix: Optional[str] = fastapi.Query(default=None, description="名称以_开头"),
+        admin_id: Optional[str] = fastapi.Query(default=None, description="管理员 id"),
+        include: list[Literal["detail"]] = fastapi.Query(default=[], description="额外返回的字段，默认不返回 detail"),
+        exclude: list[Literal["description"]] = fastapi.Query(default=[], description="不返回的字段"),
+        current_user: Optional[fastapi_users_with_username.models.UP] = fastapi.Depends(
+            user.utils.dependencies.get_current_active_verified_user_optional),
+        db_session: AsyncSession = fastapi.Depends(universal.database.get_async_session),
+) -> list[schemas.GameServerRead] | list[schemas.GameServerReadAdmin]:
+    etag, game_servers = await crud.read_game_servers(db_session, current_user, skip, limit, after, running,
+                                                      name_prefix, admin_id, "detail" in include,
+                                                      "description" not in exclude, if_none_match)
+    if game_servers is None:
+        return fastapi.Response(status_code=fastapi.status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+    if len(game_servers) == limit:
+        response.headers["X-Next-Cursor"] = str(game_servers[-1].id)
+    return game_servers
+
+
+@router.get(
+    "/recommend",
+    description="推荐负载最低的正在运行且未满的游戏服务器：上报了 max_player_count 的按 player_count / max_player_count "
+                "升序，排在未上报的之前；未上报的按 player_count 升序。",
+)
+async def recommend_game_servers(
+        count: int = fastapi.Query(default=10, ge=1, le=100, description="返回_个"),
+        name_prefix: Optional[str] = fastapi.Query(default=None, description="名称以_开头"),
         current_user: Optional[fastapi_users_with_username.models.UP] = fastapi.Depends(
             user.utils.dependencies.get_current_active_verified_user_optional),
         db_session: AsyncSession = fastapi.Depends(universal.database.get_async_session),
 ) -> list[schemas.GameServerRead] | list[schemas.GameServerReadAdmin]:
-    return list(await crud.read_game_servers(db_session, current_user, skip, limit))
+    return await crud.recommend_game_servers(db_session, current_user, count, name_prefix)
 
 
 @router.get(
     "/{game_server_id}",
     responses={
+        fastapi.status.HTTP_304_NOT_MODIFIED: {"description": _NOT_MODIFIED_DESCRIPTION},
         fastapi.status.HTTP_404_NOT_FOUND: {"description": "Game server not found"},
     },
 )
 async def get_game_server(
+        response: fastapi.Response,
         game_server_id: int,
+        if_none_match: Optional[str] = fastapi.Header(default=None),
         current_user: Optional[fastapi_users_with_username.models.UP] = fastapi.Depends(
             user.utils.dependencies.get_current_active_verified_user_optional),
         db_session: AsyncSession = fastapi.Depends(universal.database.get_async_session),
 ) -> schemas.GameServerRead | schemas.GameServerReadAdmin:
     try:
-        return await crud.read_game_server(db_session, current_user, game_server_id)
+        etag, game_server = await crud.read_game_server(db_session, current_user, game_server_id, if_none_match)
     except exceptions.GameServerNotFound:
         raise fastapi.HTTPException(status_code=fastapi.status.HTTP_404_NOT_FOUND, detail="Game server not found")
+    if game_server is None:
+        return fastapi.Response(status_code=fastapi.status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+    return game_server
 
 
 @router.patch(
@@ -6,6 +6,14 @@ from . import models
 from .status import schemas as status_schemas
 from .status import crud as status_crud
 from .status import models as status_models
+from .status import protocol as status_protocol
+
+
+def _get_status(game_server_id: int, info: pydantic.ValidationInfo) -> status_models.GameServerStatus:
+    """从 ``context={"statuses": ...}`` （见 ``status_crud.get_server_statuses``）中取状态，没有则单独查询"""
+    if info.context and "statuses" in info.context:
+        return info.context["statuses"][game_server_id]
+    return status_crud.get_server_status(game_server_id)
 
 
 class GameServerCreate(models.GameServerBase):
@@ -27,10 +35,9 @@ class GameServerRead(models.GameServerPublic, models.GameServerId):
     status: status_schemas.GameServerStatusRead = None
 
     @pydantic.model_validator(mode="after")
-    def set_status(self) -> "GameServerRead":
+    def set_status(self, info: pydantic.ValidationInfo) -> "GameServerRead":
         if self.status is None:
-            self.status = status_schemas.GameServerStatusRead.model_validate(status_crud.get_server_status(self.id),
-                                                                             from_attributes=True)
+            self.status = status_schemas.GameServerStatusRead.from_status(_get_status(self.id, info))
         return self
 
 
@@ -39,9 +46,13 @@ class GameServerReadAdmin(models.GameServerPublic, models.GameServerId, table=Fa
     reporter_host: IPvAnyAddress
     status: status_schemas.GameServerStatusRead = None
 
+    @pydantic.computed_field(description="二进制上报协议签名用的密钥，十六进制，见 game_server/status/protocol.py")
+    @property
+    def report_key(self) -> str:
+        return status_protocol.report_key(self.id).hex()
+
     @pydantic.model_validator(mode="after")
-    def set_status(self) -> "GameServerReadAdmin":
+    def set_status(self, info: pydantic.ValidationInfo) -> "GameServerReadAdmin":
         if self.status is None:
-            self.status = status_schemas.GameServerStatusRead.model_validate(status_crud.get_server_status(self.id),
-                                                                             from_attributes=True)
+            self.status = status_schemas.GameServerStatusRead.from_status(_get_status(self.id, info))
         return self
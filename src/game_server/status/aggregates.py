@@ -0,0 +1,75 @@
+import collections
+from typing import Optional
+
+from . import common, models
+
+
+class StatusAggregates:
+    """
+    Totals over the servers currently reporting, updated as statuses change and expire instead of being summed
+    on every read.
+    """
+
+    def __init__(self):
+        self.player_count = 0
+        self.state_counts: collections.Counter[common.GameServerStateEnum] = collections.Counter()
+        # admin_id -> [server_count, player_count]
+        self.admins: dict[str, list[int]] = {}
+        self.version = 0
+        """每次变化加一，用于缓存读取结果"""
+        self._contributions: dict[int, tuple[common.GameServerStateEnum, int]] = {}
+        self._admin_ids: dict[int, Optional[str]] = {}
+
+    def __len__(self) -> int:
+        return len(self._contributions)
+
+    def _apply(self, game_server_id: int, sign: int) -> None:
+        state, player_count = self._contributions[game_server_id]
+        self.player_count += sign * player_count
+        self.state_counts[state] += sign
+        admin_id = self._admin_ids.get(game_server_id)
+        if admin_id is not None:
+            admin = self.admins.setdefault(admin_id, [0, 0])
+            admin[0] += sign
+            admin[1] += sign * player_count
+            if not admin[0]:
+                del self.admins[admin_id]
+
+    def update(self, game_server_id: int, status: models.GameServerStatus) -> None:
+        contribution = (status.state, status.player_count)
+        old = self._contributions.get(game_server_id)
+        if old == contribution:
+            return
+        if old is not None:
+            self._apply(game_server_id, -1)
+        self._contributions[game_server_id] = contribution
+        self._apply(game_server_id, 1)
+        self.version += 1
+
+    def remove(self, game_server_id: int) -> None:
+        if game_server_id in self._contributions:
+            self._apply(game_server_id, -1)
+            del self._contributions[game_server_id]
+            self.version += 1
+
+    def set_admin(self, game_server_id: int, admin_id: Optional[str]) -> None:
+        """
+        Record who administrates a server, moving its contribution if it changed.
+        :param game_server_id:
+        :param admin_id:
+        :return:
+        """
+        if game_server_id in self._admin_ids and self._admin_ids[game_server_id] == admin_id:
+            return
+        reporting = game_server_id in self._contributions
+        if reporting:
+            self._apply(game_server_id, -1)
+        self._admin_ids[game_server_id] = admin_id
+        if reporting:
+            self._apply(game_server_id, 1)
+            self.version += 1
+
+    def forget(self, game_server_id: int) -> None:
+        """Remove a deleted server."""
+        self.remove(game_server_id)
+        self._admin_ids.pop(game_server_id, None)
@@ -0,0 +1,73 @@
+"""
+游戏内时间。游戏内 06:00–18:00 为白天，现实中持续 ``day_length``；18:00–次日 06:00 为夜晚，现实中持续 ``night_length``。
+"""
+import datetime
+from typing import Optional
+
+DAY_START = datetime.timedelta(hours=6)
+NIGHT_START = datetime.timedelta(hours=18)
+HALF_DAY = datetime.timedelta(hours=12)
+ONE_DAY = datetime.timedelta(days=1)
+
+
+def time_of_day(game_time: datetime.datetime) -> datetime.timedelta:
+    return game_time - game_time.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def is_day(game_time: datetime.datetime) -> bool:
+    return DAY_START <= time_of_day(game_time) < NIGHT_START
+
+
+def advance(game_time: datetime.datetime, elapsed: datetime.timedelta,
+            day_length: Optional[datetime.timedelta], night_length: Optional[datetime.timedelta]) \
+        -> Optional[datetime.datetime]:
+    """
+    The in-game time ``elapsed`` real time after ``game_time``.
+    :param game_time:
+    :param elapsed: real time, not negative
+    :param day_length: real duration of an in-game day time
+    :param night_length: real duration of an in-game night
+    :return: None if the day/night lengths are unknown or not positive, or the result is out of range
+    """
+    if not day_length or not night_length or day_length < datetime.timedelta() or night_length < datetime.timedelta():
+        return None
+    try:
+        return _advance(game_time, elapsed, day_length, night_length)
+    except OverflowError:
+        return None
+
+
+def _advance(game_time: datetime.datetime, elapsed: datetime.timedelta,
+             day_length: datetime.timedelta, night_length: datetime.timedelta) -> datetime.datetime:
+    cycle = day_length + night_length
+    cycles, remaining = divmod(elapsed, cycle)
+    game_time += cycles * ONE_DAY
+    while remaining:
+        tod = time_of_day(game_time)
+        if DAY_START <= tod < NIGHT_START:
+            phase_left = NIGHT_START - tod
+            real_left = phase_left / HALF_DAY * day_length
+        else:
+            phase_left = (DAY_START - tod) % ONE_DAY
+            real_left = phase_left / HALF_DAY * night_length
+        if remaining < real_left:
+            return game_time + phase_left * (remaining / real_left)
+        game_time += phase_left
+        remaining -= real_left
+    return game_time
+
+
+def is_predictable(old_game_time: Optional[datetime.datetime], new_game_time: Optional[datetime.datetime],
+                   elapsed: datetime.timedelta, day_length: Optional[datetime.timedelta],
+                   night_length: Optional[datetime.timedelta], tolerance: datetime.timedelta) -> bool:
+    """
+    Whether ``new_game_time`` is where the clock should be ``elapsed`` after ``old_game_time``,
+    give or take ``tolerance`` of real time.
+    """
+    if old_game_time is None or new_game_time is None:
+        return old_game_time == new_game_time
+    earliest = advance(old_game_time, max(elapsed - tolerance, datetime.timedelta()), day_length, night_length)
+    if earliest is None:
+        return old_game_time == new_game_time
+    latest = advance(old_game_time, elapsed + tolerance, day_length, night_length)
+    return earliest <= new_game_time <= latest
@@ -6,3 +6,7 @@ class GameServerStateEnum(enum.StrEnum):
     RUNNING = enum.auto()
     MAINTENANCE = enum.auto()
     ACTIVITY = enum.auto()
+
+
+STATE_CODES: tuple[GameServerStateEnum, ...] = tuple(GameServerStateEnum)
+"""二进制上报协议中的状态编号，只能在末尾追加"""
@@ -1,67 +1,440 @@
+import asyncio
 import datetime
-from . import models, common, schemas
+import functools
+import time
+from typing import Any, Optional
 
-reported_queue: list[int] = []
-reported_data: dict[int, models.GameServerStatus] = {}
+import universal.config
+from . import models, common, schemas, store, events, expiry, history, clock, heartbeat, ranking, aggregates, snapshot, waiters
+
+status_store = store.create_store(universal.config.settings.GAME_SERVER_STATUS_BACKEND,
+                                  universal.config.settings.GAME_SERVER_STATUS_PATH)
+broadcaster = events.StatusBroadcaster(universal.config.settings.GAME_SERVER_STATUS_EVENT_WINDOW)
+history_store = history.HistoryStore()
+# 共享的状态存储自己维护排名和汇总，其他 worker 的上报也算在内
+load_index = ranking.LoadIndex()
+status_aggregates = aggregates.StatusAggregates()
+generation_waiters = waiters.GenerationWaiters()
+heartbeat_planner = heartbeat.HeartbeatPlanner(universal.config.settings.GAME_SERVER_REPORT_TARGET_RATE,
+                                               lambda: len(status_store))
+
+STOPPED_STATUS = models.GameServerStatus(state=common.GameServerStateEnum.STOPPED, last_updated=None)
+GAME_TIME_TOLERANCE = datetime.timedelta(seconds=2)
+"""上报的游戏内时间与推算值相差不超过这么多现实时间，视为未变化"""
+
+report_counters = {"fast_path": 0, "full": 0}
+
+# 共享的状态存储下，已从存储读到的最新 generation，以及本 worker 自己产生、无需再从存储读的 generation
+_followed_generation: Optional[int] = None
+_own_generations: set[int] = set()
 
 
 def check_server_not_stopped(game_server_id: int, delete_if_not: bool = True) -> bool:
     """
     Check whether a server is reporting its status regularly and is not stopped.
-    If not (and ``delete_if_not``), deletes the server from ``reported_data``.
-    Does not affect ``reported_queue``!
+    If not (and ``delete_if_not``), deletes the server from ``status_store``.
     :param game_server_id:
     :param delete_if_not:
     :return:
     """
-    if game_server_id not in reported_data:
+    status = status_store.get(game_server_id)
+    if status is None:
         return False
-    if reported_data[game_server_id].last_updated is None:
-        result = False
-    elif datetime.datetime.now() - reported_data[game_server_id].last_updated < datetime.timedelta(seconds=15):
-        result = reported_data[game_server_id].state != common.GameServerStateEnum.STOPPED
-    else:
-        result = False
+    result = _is_not_stopped(status)
     if not result and delete_if_not:
-        del reported_data[game_server_id]
+        _remove(game_server_id)
     return result
 
 
+def _is_not_stopped(status: models.GameServerStatus, now: Optional[datetime.datetime] = None) -> bool:
+    return status_store.is_fresh(status, now) and status.state != common.GameServerStateEnum.STOPPED
+
+
+def _remove(game_server_id: int) -> None:
+    if status_store.remove(game_server_id) is not None:
+        _on_stopped(game_server_id)
+
+
+def _bump_generation(game_server_id: int) -> None:
+    generation = status_store.bump_generation(game_server_id)
+    if status_store.shared:
+        _own_generations.add(generation)
+    generation_waiters.notify(game_server_id)
+
+
+def _on_stopped(game_server_id: int) -> None:
+    _bump_generation(game_server_id)
+    if not status_store.shared:
+        load_index.remove(game_server_id)
+        status_aggregates.remove(game_server_id)
+    broadcaster.publish(game_server_id, _to_read(STOPPED_STATUS))
+    # 已删除的服务器没有历史，不再新建
+    history_store.record(game_server_id, int(time.time()), 0, common.GameServerStateEnum.STOPPED, create=False)
+
+
+def _to_read(status: models.GameServerStatus, now: Optional[datetime.datetime] = None) -> dict[str, Any]:
+    return schemas.GameServerStatusRead.from_status(status, now).model_dump(mode="json")
+
+
+def _visible(status: models.GameServerStatus) -> tuple:
+    """
+    Fields of ``GameServerStatusRead``. ``last_updated`` changing, or the game clock advancing as expected
+    (see ``_is_unchanged``), is not a visible change.
+    """
+    return (status.state, status.player_count, status.max_player_count, status.game_time, status.day_length,
+            status.night_length, status.detail)
+
+
+def _on_reported(game_server_id: int, old: Optional[models.GameServerStatus],
+                 new: models.GameServerStatus) -> None:
+    history_store.record(game_server_id, int(new.last_updated.timestamp()), new.player_count, new.state)
+    was_fresh = old is not None and status_store.is_fresh(old)
+    if not was_fresh or _visible(old) != _visible(new):
+        _bump_generation(game_server_id)
+        if not status_store.shared:
+            load_index.update(game_server_id, new)
+            status_aggregates.update(game_server_id, new)
+        broadcaster.publish(game_server_id, _to_read(new))
+
+
 def get_server_status(game_server_id: int) -> models.GameServerStatus:
     """
     Get the status of a server.
     :param game_server_id:
     :return:
     """
-    if not check_server_not_stopped(game_server_id):
-        return models.GameServerStatus(state=common.GameServerStateEnum.STOPPED, last_updated=None)
-    print(reported_data)
-    print(reported_queue)
-    return reported_data[game_server_id]
+    status = status_store.get(game_server_id)
+    if status is None or not _is_not_stopped(status):
+        if status is not None:
+            _remove(game_server_id)
+        return STOPPED_STATUS.model_copy()
+    return status
 
 
-def report_server_status(game_server_id: int, status: schemas.GameServerReport) -> None:
+def get_server_statuses(game_server_ids: list[int]) -> dict[int, models.GameServerStatus]:
+    """
+    Get the statuses of many servers with one store lookup, e.g. for a page of a listing.
+    Unlike ``get_server_status``, stale entries are left for ``expiry_timer`` instead of being deleted.
+    :param game_server_ids:
+    :return: game_server_id -> status, STOPPED if not reporting
+    """
+    found = status_store.get_many(game_server_ids)
+    now = datetime.datetime.now()
+    result = {}
+    for game_server_id in game_server_ids:
+        status = found.get(game_server_id)
+        if status is None or not _is_not_stopped(status, now):
+            status = STOPPED_STATUS
+        result[game_server_id] = status
+    return result
+
+
+def get_server_generations(game_server_ids: list[int]) -> dict[int, int]:
+    """
+    Generations of the last visible status change of many servers, for ETags.
+    :param game_server_ids:
+    :return: game_server_id -> generation
+    """
+    return status_store.get_generations(game_server_ids)
+
+
+def get_running_server_ids() -> list[int]:
+    """
+    Ids of the servers that are reporting regularly and are not stopped, straight from the status store.
+    :return:
+    """
+    return status_store.running_ids()
+
+
+def set_admin(game_server_id: int, admin_id: Optional[str]) -> None:
+    """
+    Record who administrates a server, for the per-admin totals of ``get_stats``.
+    :param game_server_id:
+    :param admin_id:
+    :return:
+    """
+    if status_store.shared:
+        status_store.set_admin(game_server_id, admin_id)
+    else:
+        status_aggregates.set_admin(game_server_id, admin_id)
+
+
+def forget_server(game_server_id: int) -> None:
+    """
+    Drop everything known about a deleted server, publishing that it stopped if it was reporting.
+    :param game_server_id:
+    :return:
+    """
+    history_store.remove(game_server_id)
+    _remove(game_server_id)
+    status_store.forget(game_server_id)
+    status_aggregates.forget(game_server_id)
+    # 等待中的长轮询立即返回 STOPPED
+    generation_waiters.notify(game_server_id)
+
+
+def get_recommended_server_ids(start: int, stop: int) -> list[int]:
+    """
+    Ids of RUNNING servers that are not full, least loaded first, see ``ranking.LoadIndex``.
+    With a shared store, the ranking is read from the store, so servers reporting to other workers are ranked too.
+    :param start:
+    :param stop:
+    :return:
+    """
+    if status_store.shared:
+        return status_store.ranked_ids(start, stop)
+    return load_index.slice(start, stop)
+
+
+async def wait_server_status(game_server_id: int, since: int, timeout: float) -> schemas.GameServerStatusWait:
+    """
+    Wait until the generation of a server is greater than ``since``, or ``timeout`` seconds.
+    Changes made by other workers on a shared store wake the wait up within ``broadcaster.window`` seconds,
+    see ``follow_shared_store``.
+    :param game_server_id:
+    :param since: generation the client already has
+    :param timeout: seconds
+    :return: the current generation and status, whether or not it changed
+    """
+    generation = get_server_generations([game_server_id])[game_server_id]
+    if generation <= since and timeout > 0:
+        await generation_waiters.wait(game_server_id, timeout)
+        generation = get_server_generations([game_server_id])[game_server_id]
+    return schemas.GameServerStatusWait(
+        generation=generation,
+        status=schemas.GameServerStatusRead.from_status(get_server_status(game_server_id)),
+    )
+
+
+def _is_unchanged(old: Optional[models.GameServerStatus], report: schemas.GameServerReport,
+                  now: datetime.datetime) -> bool:
+    """
+    Whether a report only repeats the stored status, apart from the game clock advancing as expected.
+    """
+    if old is None or not status_store.is_fresh(old, now):
+        return False
+    return (old.state == report.state and old.player_count == report.player_count
+            and old.max_player_count == report.max_player_count and old.detail == report.detail
+            and old.day_length == report.day_length and old.night_length == report.night_length
+            and clock.is_predictable(old.game_time, report.game_time, now - old.last_updated,
+                                     report.day_length, report.night_length, GAME_TIME_TOLERANCE))
+
+
+def _timeout(report: schemas.GameServerReport) -> datetime.timedelta:
+    """
+    The timeout reported by the server, stretched to cover the interval it is asked to report at.
+    """
+    return max(report.timeout or status_store.timeout, datetime.timedelta(seconds=heartbeat_planner.min_timeout()))
+
+
+def _apply_report(game_server_id: int, report: schemas.GameServerReport) -> models.GameServerStatus:
+    """
+    Build the status to store for a report. Unchanged reports take the fast path: the stored status is only
+    refreshed, without validating a new model, bumping the generation or publishing an event.
+    :param game_server_id:
+    :param report:
+    :return:
+    """
+    old = status_store.get(game_server_id)
+    now = datetime.datetime.now()
+    timeout = _timeout(report)
+    if _is_unchanged(old, report, now):
+        report_counters["fast_path"] += 1
+        old.last_updated = now
+        old.game_time = report.game_time
+        old.timeout = timeout
+        history_store.record(game_server_id, int(now.timestamp()), old.player_count, old.state)
+        return old
+    report_counters["full"] += 1
+    new = models.GameServerStatus.model_validate(report, from_attributes=True)
+    new.last_updated = now
+    new.timeout = timeout
+    _on_reported(game_server_id, old, new)
+    return new
+
+
+def _accepted(status: models.GameServerStatus) -> schemas.GameServerReportAccepted:
+    deadline = status_store.deadline(status)
+    expiry_timer.notify(deadline)
+    return schemas.GameServerReportAccepted(interval=heartbeat_planner.next_interval(), expires_at=deadline)
+
+
+def report_server_status(game_server_id: int, status: schemas.GameServerReport) -> schemas.GameServerReportAccepted:
     """
     Report the status of a server.
     :param game_server_id:
     :param status:
+    :return: when the server should report next, and when it is considered stopped if it does not
+    """
+    heartbeat_planner.record()
+    new = _apply_report(game_server_id, status)
+    status_store.put(game_server_id, new)
+    return _accepted(new)
+
+
+def report_server_statuses(statuses: dict[int, schemas.GameServerReport]) \
+        -> dict[int, schemas.GameServerReportAccepted]:
+    """
+    Report the statuses of many servers in one pass.
+    :param statuses: game_server_id -> status
+    :return: game_server_id -> when the server should report next, and when it is considered stopped if it does not
+    """
+    heartbeat_planner.record(len(statuses))
+    new = {game_server_id: _apply_report(game_server_id, status) for game_server_id, status in statuses.items()}
+    status_store.put_many(new)
+    return {game_server_id: _accepted(status) for game_server_id, status in new.items()}
+
+
+def get_report_counters() -> schemas.GameServerReportCounters:
+    """
+    How many reports this worker took through the fast path and the full path since it started.
+    :return:
+    """
+    return schemas.GameServerReportCounters.model_validate(report_counters)
+
+
+def snapshot_statuses() -> dict[int, Any]:
+    """
+    Statuses of all servers that are not stopped, for new WebSocket / SSE subscribers.
+    The game clock keeps running between reports, so a status with a ``game_time`` is given as a function,
+    extrapolated again for every subscriber instead of being cached by ``broadcaster``.
+    :return: game_server_id -> JSON-compatible ``GameServerStatusRead``, or a function building it
+    """
+    now = datetime.datetime.now()
+    return {game_server_id: functools.partial(_to_read, status) if status.game_time is not None else _to_read(status)
+            for game_server_id, status in status_store.items() if _is_not_stopped(status, now)}
+
+
+def follow_shared_store() -> None:
+    """
+    With a shared status store, publish the changes made by the other workers, read from the generations
+    in the store, to the subscribers of this worker, and wake the long polls waiting for them.
+    :return:
+    """
+    global _followed_generation, _own_generations
+    latest, changed = status_store.generations_since(_followed_generation)
+    _followed_generation = latest
+    own, _own_generations = _own_generations, set()
+    changed = [game_server_id for game_server_id, generation in changed.items() if generation not in own]
+    if not changed:
+        return
+    statuses = status_store.get_many(changed)
+    now = datetime.datetime.now()
+    for game_server_id in changed:
+        status = statuses.get(game_server_id)
+        if status is None or not _is_not_stopped(status, now):
+            status = STOPPED_STATUS
+        broadcaster.publish(game_server_id, _to_read(status, now))
+        generation_waiters.notify(game_server_id)
+
+
+async def run_shared_feed() -> None:
+    """
+    Run ``follow_shared_store`` every ``broadcaster.window`` seconds until cancelled. Returns at once if the store
+    is private to this worker, which sees every change itself.
+    :return:
+    """
+    if not status_store.shared:
+        return
+    follow_shared_store()
+    while True:
+        await asyncio.sleep(broadcaster.window)
+        follow_shared_store()
+
+
+_stats_cache: Optional[tuple[int, schemas.GameServerStats]] = None
+
+
+def get_stats() -> schemas.GameServerStats:
+    """
+    Totals over the servers currently reporting, from ``status_aggregates``. Only rebuilt after a change.
+    With a shared store, the totals kept by the store are read instead, so servers reporting to other workers
+    are counted too.
+    :return:
+    """
+    global _stats_cache
+    if status_store.shared:
+        states, admins = status_store.totals()
+        return schemas.GameServerStats(
+            server_count=sum(server_count for server_count, _ in states.values()),
+            player_count=sum(player_count for _, player_count in states.values()),
+            state_counts={state: states.get(state, (0, 0))[0] for state in common.GameServerStateEnum},
+            admins={admin_id: schemas.GameServerAdminStats(server_count=server_count, player_count=player_count)
+                    for admin_id, (server_count, player_count) in admins.items()},
+        )
+    if _stats_cache is None or _stats_cache[0] != status_aggregates.version:
+        _stats_cache = status_aggregates.version, schemas.GameServerStats(
+            server_count=len(status_aggregates),
+            player_count=status_aggregates.player_count,
+            state_counts={state: status_aggregates.state_counts[state] for state in common.GameServerStateEnum},
+            admins={admin_id: schemas.GameServerAdminStats(server_count=server_count, player_count=player_count)
+                    for admin_id, (server_count, player_count) in status_aggregates.admins.items()},
+        )
+    return _stats_cache[1]
+
+
+def get_server_status_history(game_server_id: int, range_seconds: int,
+                              resolution: Optional[int] = None) -> schemas.GameServerStatusHistory:
+    """
+    Get the status history of a server over the last ``range_seconds``.
+    :param game_server_id:
+    :param range_seconds:
+    :param resolution: minimal resolution in seconds; the finest tier spanning the range if None
     :return:
     """
-    reported_data[game_server_id] = models.GameServerStatus.model_validate(status, from_attributes=True)
-    # idx = reported_queue.index(game_server_id)
-    # if idx != -1:
-    #     reported_queue.pop(idx)
-    try:
-        reported_queue.remove(game_server_id)
-    except ValueError:
-        pass
-    reported_queue.append(game_server_id)
+    server_history = history_store.get(game_server_id) or history.ServerHistory()
+    tier = server_history.select_tier(range_seconds, resolution)
+    timestamps, player_counts, state_codes = tier.query(int(time.time()) - range_seconds)
+    return schemas.GameServerStatusHistory(
+        resolution=tier.resolution,
+        timestamps=timestamps,
+        player_counts=player_counts,
+        states=[common.STATE_CODES[state_code] for state_code in state_codes],
+    )
 
 
 def cleanup_reported_data() -> None:
     """
-    Cleanup the reported data.
+    Cleanup the reported data, publishing a STOPPED transition for every expired server.
+    Called by ``expiry_timer`` at each deadline.
     :return:
     """
-    while reported_queue and check_server_not_stopped(reported_queue[0]):
-        reported_queue.pop(0)
+    for game_server_id in status_store.expire():
+        _on_stopped(game_server_id)
+
+
+async def save_snapshot() -> None:
+    """
+    Save the status store to ``[game_server] status_snapshot_path``, on shutdown and periodically.
+    The snapshot is taken on the event loop and written in a thread, by one worker only (see ``snapshot.is_writer``).
+    :return:
+    """
+    path = universal.config.settings.GAME_SERVER_STATUS_SNAPSHOT_PATH
+    if path is None or not snapshot.is_writer(path):
+        return
+    data = snapshot.encode(status_store.items(), status_store.all_generations())
+    await asyncio.to_thread(snapshot.write, path, data)
+
+
+def restore_snapshot() -> int:
+    """
+    Load the snapshot saved by ``save_snapshot`` into the status store, dropping statuses that have expired since,
+    so that servers do not show STOPPED until their next report after a restart.
+    :return: how many statuses were restored
+    """
+    path = universal.config.settings.GAME_SERVER_STATUS_SNAPSHOT_PATH
+    if path is None:
+        return 0
+    statuses, generations = snapshot.read(path)
+    now = datetime.datetime.now()
+    statuses = {game_server_id: status for game_server_id, status in statuses.items() if _is_not_stopped(status, now)}
+    restored = status_store.restore(statuses, generations)
+    if status_store.shared:
+        return len(restored)
+    for game_server_id in restored:
+        load_index.update(game_server_id, statuses[game_server_id])
+        status_aggregates.update(game_server_id, statuses[game_server_id])
+    return len(restored)
+
+
+expiry_timer = expiry.ExpiryTimer(status_store.next_deadline, cleanup_reported_data)
@@ -0,0 +1,124 @@
+import asyncio
+import json
+from typing import Any, Callable, Iterable, Optional, Union
+
+SUBSCRIBER_QUEUE_SIZE = 64
+
+
+def _fragment(game_server_id: int, status: Any) -> str:
+    """``"id":{...}``, one member of the ``servers`` object of a message"""
+    return f'"{game_server_id}":' + json.dumps(status, ensure_ascii=False, separators=(",", ":"))
+
+
+class Message:
+    """
+    A serialized broadcast. Serialized once and shared by every subscriber.
+    """
+    __slots__ = ("text", "sse")
+
+    def __init__(self, kind: str, servers: dict[int, Any]):
+        self._set(kind, json.dumps({"type": kind, "servers": servers}, ensure_ascii=False, separators=(",", ":")))
+
+    @classmethod
+    def from_fragments(cls, kind: str, fragments: Iterable[str]) -> "Message":
+        """
+        :param kind:
+        :param fragments: members of ``servers``, see ``_fragment``
+        :return:
+        """
+        message = cls.__new__(cls)
+        message._set(kind, f'{{"type":"{kind}","servers":{{{",".join(fragments)}}}}}')
+        return message
+
+    def _set(self, kind: str, text: str) -> None:
+        self.text = text
+        self.sse = f"event: {kind}\ndata: {text}\n\n"
+
+
+class Subscriber:
+    def __init__(self):
+        self.queue: asyncio.Queue[Optional[Message]] = asyncio.Queue(SUBSCRIBER_QUEUE_SIZE)
+
+    def push(self, message: Optional[Message]) -> bool:
+        """
+        :return: False if the subscriber is too slow and has been dropped
+        """
+        try:
+            self.queue.put_nowait(message)
+            return True
+        except asyncio.QueueFull:
+            # 丢弃最旧的消息，放入 None 让订阅者结束
+            self.queue.get_nowait()
+            self.queue.put_nowait(None)
+            return False
+
+    async def get(self) -> Optional[Message]:
+        """
+        :return: the next message, or None if the subscriber has been dropped
+        """
+        return await self.queue.get()
+
+
+class StatusBroadcaster:
+    """
+    Pushes game server status changes to WebSocket / SSE subscribers.
+    Changes are coalesced over ``window`` seconds: only the latest status of each changed server is sent,
+    in one message serialized once for all subscribers.
+    """
+
+    def __init__(self, window: float = 1.0):
+        self.window = window
+        self._subscribers: set[Subscriber] = set()
+        self._pending: dict[int, Any] = {}
+        # game_server_id -> 序列化好的片段，或每次订阅都要重新计算的状态
+        self._snapshot: Optional[dict[int, Union[str, Callable[[], Any]]]] = None
+
+    def publish(self, game_server_id: int, status: Any) -> None:
+        """
+        Queue a change for the next broadcast.
+        :param game_server_id:
+        :param status: JSON-compatible status
+        :return:
+        """
+        self._pending[game_server_id] = status
+        self._snapshot = None
+
+    def subscribe(self, snapshot: Callable[[], dict[int, Any]]) -> tuple[Subscriber, Message]:
+        """
+        :param snapshot: builds the statuses of all servers, only called if the cached snapshot is outdated.
+            A status that changes with time may be given as a function building it, called for every subscriber;
+            the others are serialized once and cached until the next ``publish``.
+        :return: (subscriber, snapshot message)
+        """
+        if self._snapshot is None:
+            self._snapshot = {game_server_id: status if callable(status) else _fragment(game_server_id, status)
+                              for game_server_id, status in snapshot().items()}
+        message = Message.from_fragments("snapshot", (
+            part if isinstance(part, str) else _fragment(game_server_id, part())
+            for game_server_id, part in self._snapshot.items()))
+        subscriber = Subscriber()
+        self._subscribers.add(subscriber)
+        return subscriber, message
+
+    def unsubscribe(self, subscriber: Subscriber) -> None:
+        self._subscribers.discard(subscriber)
+
+    def flush(self) -> None:
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, {}
+        if not self._subscribers:
+            return
+        message = Message("delta", pending)
+        for subscriber in list(self._subscribers):
+            if not subscriber.push(message):
+                self._subscribers.discard(subscriber)
+
+    async def run(self) -> None:
+        """
+        Broadcast every ``window`` seconds until cancelled.
+        :return:
+        """
+        while True:
+            await asyncio.sleep(self.window)
+            self.flush()
@@ -0,0 +1,49 @@
+import asyncio
+import datetime
+from typing import Any, Callable, Optional
+
+
+class ExpiryTimer:
+    """
+    A single task that sleeps until the earliest deadline in the status store, then expires what is due.
+    Reports only compare their deadline with the one being waited for, which is O(1).
+    """
+
+    def __init__(self, next_deadline: Callable[[], Optional[datetime.datetime]], expire: Callable[[], Any]):
+        """
+        :param next_deadline: earliest deadline in the store, None if empty
+        :param expire: expires every due entry and emits the transition events
+        """
+        self._next_deadline = next_deadline
+        self._expire = expire
+        self._waiting_for: Optional[datetime.datetime] = None
+        self._wakeup = asyncio.Event()
+
+    def notify(self, deadline: datetime.datetime) -> None:
+        """
+        Tell the timer about a new deadline, waking it up if it is earlier than the one being waited for.
+        :param deadline:
+        :return:
+        """
+        if self._waiting_for is None or deadline < self._waiting_for:
+            self._waiting_for = deadline
+            self._wakeup.set()
+
+    async def run(self) -> None:
+        """
+        Expire entries at their deadlines until cancelled.
+        :return:
+        """
+        while True:
+            self._expire()
+            self._waiting_for = self._next_deadline()
+            self._wakeup.clear()
+            if self._waiting_for is None:
+                await self._wakeup.wait()
+                continue
+            delay = (self._waiting_for - datetime.datetime.now()).total_seconds()
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
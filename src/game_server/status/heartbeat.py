@@ -0,0 +1,81 @@
+import random
+import time
+from typing import Callable, Optional
+
+MIN_INTERVAL = 5.0
+MAX_INTERVAL = 60.0
+TIMEOUT_FACTOR = 3
+"""连续错过这么多次上报才认为服务器 stopped"""
+MIN_TIMEOUT = MIN_INTERVAL * TIMEOUT_FACTOR
+"""以最短间隔上报时的超时秒数，也是默认值和上报的 timeout 的下限"""
+JITTER = 0.1
+RATE_SMOOTHING = 0.3
+MAX_STEP = 1.25
+"""每次重新计算时，间隔最多变为原来的这么多倍（或几分之一），避免服务器还没采用新间隔时来回跳动"""
+
+
+class HeartbeatPlanner:
+    """
+    Picks the interval game servers should report at so that the servers currently reporting, ``count_reporters()``,
+    arrive at ``target_rate`` reports per second: ``interval = reporters / target_rate``, between ``MIN_INTERVAL``
+    and ``MAX_INTERVAL``.
+
+    The number of reporters does not depend on the interval handed out, so there is no feedback loop: estimating
+    it from the observed rate instead (``rate * interval``) overshoots, because servers only adopt a new interval one
+    period later. The interval still moves by at most ``MAX_STEP`` per ``refresh``. The interval handed out is
+    jittered so that servers that (re)started together drift apart.
+    """
+
+    def __init__(self, target_rate: float, count_reporters: Callable[[], int], refresh: float = 1.0):
+        """
+        :param target_rate: reports per second wanted from everyone counted by ``count_reporters``
+        :param count_reporters: how many servers are reporting, e.g. ``len(status_store)``
+        :param refresh: seconds between two plans
+        """
+        self.target_rate = target_rate
+        self.count_reporters = count_reporters
+        self.refresh = refresh
+        self.interval = MIN_INTERVAL
+        self.rate = 0.0
+        """观察到的每秒上报数（平滑后），仅用于监控"""
+        self._count = 0
+        self._window_start = time.monotonic()
+
+    def record(self, count: int = 1, now: Optional[float] = None) -> None:
+        """
+        Count reports taken, re-planning the interval at most every ``refresh`` seconds.
+        :param count:
+        :param now: ``time.monotonic()``
+        :return:
+        """
+        self._count += count
+        now = now or time.monotonic()
+        elapsed = now - self._window_start
+        if elapsed < self.refresh:
+            return
+        self.rate += RATE_SMOOTHING * (self._count / elapsed - self.rate)
+        self._count = 0
+        self._window_start = now
+        self.plan(self.count_reporters())
+
+    def plan(self, reporters: int) -> float:
+        """
+        Move the interval towards ``reporters / target_rate``.
+        :param reporters:
+        :return: the new interval
+        """
+        wanted = min(max(reporters / self.target_rate, MIN_INTERVAL), MAX_INTERVAL)
+        self.interval = min(max(wanted, self.interval / MAX_STEP), self.interval * MAX_STEP)
+        return self.interval
+
+    def next_interval(self) -> float:
+        """
+        :return: seconds until the next report, with jitter
+        """
+        return self.interval * random.uniform(1 - JITTER, 1 + JITTER)
+
+    def min_timeout(self) -> float:
+        """
+        :return: seconds a server may stay silent before it is considered stopped, at the current interval
+        """
+        return self.interval * TIMEOUT_FACTOR
@@ -0,0 +1,108 @@
+import array
+from typing import Optional
+
+from . import common
+
+TIERS: tuple[tuple[int, int], ...] = (
+    (15, 240),  # 15 秒，1 小时
+    (60, 1440),  # 1 分钟，1 天
+    (900, 672),  # 15 分钟，7 天
+    (3600, 720),  # 1 小时，30 天
+)
+"""(resolution, capacity) of each tier, in seconds and slots"""
+
+BYTES_PER_SERVER = sum(capacity for _, capacity in TIERS) * (4 + 4 + 1)
+"""每个游戏服务器的历史占用的内存（约 27 KiB），与上报频率无关"""
+
+
+class Tier:
+    """
+    A ring buffer of fixed-resolution slots. Each slot keeps the peak player count and the last state reported in it.
+    """
+    __slots__ = ("resolution", "capacity", "timestamps", "player_counts", "states", "_next", "_size")
+
+    def __init__(self, resolution: int, capacity: int):
+        self.resolution = resolution
+        self.capacity = capacity
+        self.timestamps = array.array("I", bytes(4 * capacity))
+        self.player_counts = array.array("I", bytes(4 * capacity))
+        self.states = array.array("B", bytes(capacity))
+        self._next = 0
+        self._size = 0
+
+    def record(self, timestamp: int, player_count: int, state_code: int) -> None:
+        slot_start = timestamp - timestamp % self.resolution
+        last = self._next - 1
+        if self._size and self.timestamps[last] == slot_start:
+            self.player_counts[last] = max(self.player_counts[last], player_count)
+            self.states[last] = state_code
+            return
+        self.timestamps[self._next] = slot_start
+        self.player_counts[self._next] = player_count
+        self.states[self._next] = state_code
+        self._next = (self._next + 1) % self.capacity
+        self._size = min(self._size + 1, self.capacity)
+
+    def query(self, since: int) -> tuple[list[int], list[int], list[int]]:
+        """
+        :param since: unix timestamp
+        :return: (timestamps, player_counts, state_codes) of the slots starting at or after ``since``, oldest first
+        """
+        start = (self._next - self._size) % self.capacity
+        order = [(start + i) % self.capacity for i in range(self._size)]
+        order = [i for i in order if self.timestamps[i] >= since]
+        return ([self.timestamps[i] for i in order],
+                [self.player_counts[i] for i in order],
+                [self.states[i] for i in order])
+
+
+class ServerHistory:
+    """
+    Status history of one game server, downsampled into every tier of ``TIERS`` as it is recorded.
+    """
+    __slots__ = ("tiers",)
+
+    def __init__(self):
+        self.tiers = tuple(Tier(resolution, capacity) for resolution, capacity in TIERS)
+
+    def record(self, timestamp: int, player_count: int, state: common.GameServerStateEnum) -> None:
+        state_code = common.STATE_CODES.index(state)
+        for tier in self.tiers:
+            tier.record(timestamp, player_count, state_code)
+
+    def select_tier(self, range_seconds: int, resolution: Optional[int] = None) -> Tier:
+        """
+        The finest tier that is at least as coarse as ``resolution`` and spans ``range_seconds``,
+        or the coarsest tier if none does.
+        :param range_seconds:
+        :param resolution:
+        :return:
+        """
+        for tier in self.tiers:
+            if (resolution is None or tier.resolution >= resolution) \
+                    and tier.resolution * tier.capacity >= range_seconds:
+                return tier
+        return self.tiers[-1]
+
+
+class HistoryStore:
+    def __init__(self):
+        self._histories: dict[int, ServerHistory] = {}
+
+    def record(self, game_server_id: int, timestamp: int, player_count: int,
+               state: common.GameServerStateEnum, create: bool = True) -> None:
+        """
+        :param create: start a history for a server that has none; if False, only extend an existing one
+        """
+        history = self._histories.get(game_server_id)
+        if history is None:
+            if not create:
+                return
+            history = self._histories[game_server_id] = ServerHistory()
+        history.record(timestamp, player_count, state)
+
+    def get(self, game_server_id: int) -> Optional[ServerHistory]:
+        return self._histories.get(game_server_id)
+
+    def remove(self, game_server_id: int) -> None:
+        self._histories.pop(game_server_id, None)
@@ -0,0 +1,132 @@
+import asyncio
+import logging
+from typing import Optional
+
+import universal.config
+import universal.rate_limit
+from . import crud, protocol, schemas
+from .. import crud as game_server_crud
+
+logger = logging.getLogger(__name__)
+
+MAX_UNCACHED_IN_FLIGHT = 64
+"""UDP 上报中同时等待查询 reporter_host 的数据报数，超出的直接丢弃"""
+
+
+async def handle_frame(frame: bytes, host: str) -> tuple[int, protocol.Result]:
+    """
+    Authorize and store one report frame.
+    :param frame:
+    :param host: IP address the frame came from
+    :return: (game_server_id, result)
+    """
+    try:
+        game_server_id, report = protocol.decode_report(frame)
+    except protocol.BadMac as e:
+        return e.game_server_id, protocol.Result.BAD_MAC
+    except protocol.BadFrame:
+        return 0, protocol.Result.BAD_FRAME
+    cached = game_server_crud.peek_reporter_host(game_server_id)
+    exists, reporter_host = cached if cached is not None else await game_server_crud.get_reporter_host(game_server_id)
+    return game_server_id, store_report(game_server_id, report, exists, reporter_host, host)
+
+
+def store_report(game_server_id: int, report: schemas.GameServerReport, exists: bool, reporter_host: Optional[str],
+                 host: str) -> protocol.Result:
+    if not exists:
+        return protocol.Result.NOT_FOUND
+    if host != reporter_host:
+        return protocol.Result.HOST_MISMATCH
+    crud.report_server_status(game_server_id, report)
+    return protocol.Result.OK
+
+
+class ReportDatagramProtocol(asyncio.DatagramProtocol):
+    """
+    UDP 上报。reporter_host 命中缓存时同步处理，不为每个数据报创建 task。
+
+    来源地址可以伪造，所以只对通过 mac 校验、来自 reporter_host 的帧回复 ACK，其余静默丢弃。
+    未命中缓存的帧需要查询数据库：每个来源 IP 受令牌桶限制，同时进行的查询不超过 ``MAX_UNCACHED_IN_FLIGHT``。
+    """
+
+    def __init__(self):
+        self.transport: Optional[asyncio.DatagramTransport] = None
+        self._tasks: set[asyncio.Task] = set()
+        # 每个数据报都要检查，只在本进程内限流
+        self._buckets = universal.rate_limit.MemoryBuckets()
+
+    def connection_made(self, transport: asyncio.DatagramTransport) -> None:
+        self.transport = transport
+
+    def datagram_received(self, data: bytes, addr: tuple) -> None:
+        try:
+            game_server_id, report = protocol.decode_report(data)
+        except protocol.BadFrame:
+            return
+        cached = game_server_crud.peek_reporter_host(game_server_id)
+        if cached is not None:
+            self._reply(game_server_id, store_report(game_server_id, report, *cached, addr[0]), addr)
+        elif len(self._tasks) < MAX_UNCACHED_IN_FLIGHT \
+                and not self._buckets.take(addr[0], universal.config.settings.GAME_SERVER_REPORT_LOOKUP_PER_SECOND,
+                                           universal.config.settings.GAME_SERVER_REPORT_LOOKUP_BURST):
+            task = asyncio.create_task(self._handle_uncached(game_server_id, report, addr))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _handle_uncached(self, game_server_id: int, report: schemas.GameServerReport, addr: tuple) -> None:
+        exists, reporter_host = await game_server_crud.get_reporter_host(game_server_id)
+        self._reply(game_server_id, store_report(game_server_id, report, exists, reporter_host, addr[0]), addr)
+
+    def _reply(self, game_server_id: int, result: protocol.Result, addr: tuple) -> None:
+        if result == protocol.Result.OK:
+            self.transport.sendto(protocol.encode_ack(game_server_id, result), addr)
+
+
+class ReportListener:
+    """
+    与 FastAPI 应用一同运行的 TCP/UDP 二进制上报服务，见 ``protocol``。
+    """
+
+    def __init__(self, host: str, tcp_port: Optional[int], udp_port: Optional[int]):
+        self.host = host
+        self.tcp_port = tcp_port
+        self.udp_port = udp_port
+        self._tcp_server: Optional[asyncio.Server] = None
+        self._udp_transport: Optional[asyncio.DatagramTransport] = None
+        self._tcp_writers: set[asyncio.StreamWriter] = set()
+
+    async def start(self) -> None:
+        if self.tcp_port is not None:
+            self._tcp_server = await asyncio.start_server(self._handle_tcp_connection, self.host, self.tcp_port)
+            logger.info("Game server report TCP listener on %s:%d", self.host, self.tcp_port)
+        if self.udp_port is not None:
+            self._udp_transport, _ = await asyncio.get_running_loop().create_datagram_endpoint(
+                ReportDatagramProtocol, local_addr=(self.host, self.udp_port))
+            logger.info("Game server report UDP listener on %s:%d", self.host, self.udp_port)
+
+    async def _handle_tcp_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        host = writer.get_extra_info("peername")[0]
+        self._tcp_writers.add(writer)
+        try:
+            while True:
+                frame = await reader.readexactly(protocol.FRAME.size)
+                game_server_id, result = await handle_frame(frame, host)
+                writer.write(protocol.encode_ack(game_server_id, result))
+                await writer.drain()
+                if result == protocol.Result.BAD_FRAME:
+                    # 帧边界已经丢失，无法继续解析
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self._tcp_writers.discard(writer)
+            writer.close()
+
+    async def close(self) -> None:
+        if self._tcp_server is not None:
+            self._tcp_server.close()
+            for writer in list(self._tcp_writers):
+                writer.close()
+            await self._tcp_server.wait_closed()
+        if self._udp_transport is not None:
+            self._udp_transport.close()
@@ -3,18 +3,29 @@ from typing import Optional, TYPE_CHECKING
 
 import pydantic
 
-from . import common
+from . import common, heartbeat
+
+MIN_PHASE_LENGTH = datetime.timedelta(seconds=10)
+"""白天、夜晚在现实中的最短时长，太短会使推算游戏内时间溢出"""
+MAX_PHASE_LENGTH = datetime.timedelta(days=1)
+MAX_PLAYER_COUNT = 2 ** 31 - 1
+"""历史记录以 32 位整数保存玩家数"""
+MIN_REPORT_TIMEOUT = datetime.timedelta(seconds=heartbeat.MIN_TIMEOUT)
+"""更短的 timeout 总会被 ``HeartbeatPlanner.min_timeout`` 延长，所以不接受"""
+MAX_REPORT_TIMEOUT = datetime.timedelta(minutes=5)
 
 
 class GameServerStatusBase(pydantic.BaseModel):
     state: common.GameServerStateEnum = pydantic.Field(default=common.GameServerStateEnum.STOPPED)
-    player_count: int = pydantic.Field(default=0, ge=0)
+    player_count: int = pydantic.Field(default=0, ge=0, le=MAX_PLAYER_COUNT)
+    max_player_count: Optional[int] = pydantic.Field(default=None, ge=1, le=MAX_PLAYER_COUNT,
+                                                     description="最多容纳的玩家数，用于推荐服务器")
     if TYPE_CHECKING:
         game_time: Optional[datetime.datetime]
     else:
         game_time: Optional[pydantic.NaiveDatetime] = pydantic.Field(default=None)
-    day_length: Optional[datetime.timedelta] = None
-    night_length: Optional[datetime.timedelta] = None
+    day_length: Optional[datetime.timedelta] = pydantic.Field(default=None, ge=MIN_PHASE_LENGTH, le=MAX_PHASE_LENGTH)
+    night_length: Optional[datetime.timedelta] = pydantic.Field(default=None, ge=MIN_PHASE_LENGTH, le=MAX_PHASE_LENGTH)
 
     detail: Optional[str] = pydantic.Field(default=None)
 
@@ -23,4 +34,5 @@ class GameServerStatus(GameServerStatusBase):
     if TYPE_CHECKING:
         last_updated: Optional[datetime.datetime]
     else:
-        last_updated: Optional[pydantic.AwareDatetime] = pydantic.Field(default_factory=datetime.datetime.now)
+        last_updated: Optional[pydantic.NaiveDatetime] = pydantic.Field(default_factory=datetime.datetime.now)
+    timeout: Optional[datetime.timedelta] = pydantic.Field(default=None, description="服务器上报的超时时间")
@@ -0,0 +1,161 @@
+"""
+游戏服务器二进制上报协议。
+
+TCP（长连接，帧首尾相接）和 UDP（一个数据报一帧）使用同样的定长帧，所有字段均为网络字节序::
+
+    offset  size  field
+    0       2     magic, b"R3"
+    2       1     version, 2
+    3       4     game_server_id, uint32
+    7       1     state, ``common.STATE_CODES`` 中的下标
+    8       1     flags, bit0: game_time, bit1: day_length, bit2: night_length 有效
+    9       4     player_count, uint32
+    13      4     max_player_count, uint32, 0 表示不限
+    17      2     timeout, uint16, 秒，0 表示默认
+    19      8     game_time, int64, 自 1970-01-01T00:00 起的微秒数（naive）
+    27      4     day_length, float32, 分钟
+    31      4     night_length, float32, 分钟
+    35      16    mac, 以 ``report_key`` 对前 35 字节计算的 HMAC-SHA256 的前 16 字节
+
+``report_key`` 由 ``SECRET_KEY`` 和 game_server_id 派生，管理员可在游戏服务器信息中读取（``report_key``，十六进制）。
+mac 在查询数据库之前校验，伪造的帧不会引起查询。
+
+TCP 上每收到一帧，服务端回复一个 ``ACK`` 帧：magic, version, game_server_id, result（``Result``）。
+UDP 只对通过校验的帧回复 ACK，伪造来源地址的数据报不会被反射给他人。
+二进制上报不含 detail。
+"""
+import datetime
+import enum
+import functools
+import hashlib
+import hmac
+import struct
+
+import universal.config
+from . import common, models, schemas
+
+MAGIC = b"R3"
+VERSION = 2
+
+FRAME = struct.Struct("!2sBIBBIIHqff16s")
+ACK = struct.Struct("!2sBIB")
+MAC_SIZE = 16
+SIGNED = slice(0, FRAME.size - MAC_SIZE)
+
+FLAG_GAME_TIME = 1 << 0
+FLAG_DAY_LENGTH = 1 << 1
+FLAG_NIGHT_LENGTH = 1 << 2
+
+EPOCH = datetime.datetime(1970, 1, 1)
+MICROSECOND = datetime.timedelta(microseconds=1)
+
+
+class Result(enum.IntEnum):
+    OK = 0
+    BAD_FRAME = 1
+    NOT_FOUND = 2
+    HOST_MISMATCH = 3
+    BAD_MAC = 4
+
+
+class BadFrame(Exception):
+    pass
+
+
+class BadMac(BadFrame):
+    """The frame is well-formed, but not signed with the key of its game server."""
+
+    def __init__(self, game_server_id: int):
+        super().__init__(game_server_id)
+        self.game_server_id = game_server_id
+
+
+@functools.lru_cache(maxsize=65536)
+def report_key(game_server_id: int) -> bytes:
+    """
+    The key a game server signs its binary reports with.
+    :param game_server_id:
+    :return: 32 bytes
+    """
+    return hmac.digest(universal.config.settings.SECRET_KEY.encode(), b"game_server_report:%d" % game_server_id,
+                       hashlib.sha256)
+
+
+def _mac(game_server_id: int, signed: bytes) -> bytes:
+    return hmac.digest(report_key(game_server_id), signed, hashlib.sha256)[:MAC_SIZE]
+
+
+def decode_report(frame: bytes) -> tuple[int, schemas.GameServerReport]:
+    """
+    Decode a report frame. The result is built without pydantic validation, so the bounds of
+    ``GameServerReport`` are checked here; any field out of range makes the whole frame bad.
+    :param frame: exactly ``FRAME.size`` bytes
+    :return: (game_server_id, report)
+    :raises BadMac: the frame is not signed with the key of its game server
+    """
+    try:
+        magic, version, game_server_id, state, flags, player_count, max_player_count, timeout, game_time, \
+            day_length, night_length, mac = FRAME.unpack(frame)
+    except struct.error:
+        raise BadFrame()
+    if magic != MAGIC or version != VERSION:
+        raise BadFrame()
+    if not hmac.compare_digest(mac, _mac(game_server_id, frame[SIGNED])):
+        raise BadMac(game_server_id)
+    if state >= len(common.STATE_CODES) or player_count > models.MAX_PLAYER_COUNT \
+            or max_player_count > models.MAX_PLAYER_COUNT:
+        raise BadFrame()
+    timeout = datetime.timedelta(seconds=timeout) if timeout else None
+    if timeout is not None and not models.MIN_REPORT_TIMEOUT <= timeout <= models.MAX_REPORT_TIMEOUT:
+        raise BadFrame()
+    try:
+        report = schemas.GameServerReport.model_construct(
+            state=common.STATE_CODES[state],
+            player_count=player_count,
+            max_player_count=max_player_count or None,
+            timeout=timeout,
+            game_time=EPOCH + game_time * MICROSECOND if flags & FLAG_GAME_TIME else None,
+            day_length=_phase_length(day_length) if flags & FLAG_DAY_LENGTH else None,
+            night_length=_phase_length(night_length) if flags & FLAG_NIGHT_LENGTH else None,
+            detail=None,
+        )
+    except (ValueError, OverflowError):
+        # NaN / inf 时长，或超出 datetime 范围的 game_time
+        raise BadFrame()
+    return game_server_id, report
+
+
+def _phase_length(minutes: float) -> datetime.timedelta:
+    length = datetime.timedelta(minutes=minutes)
+    if not models.MIN_PHASE_LENGTH <= length <= models.MAX_PHASE_LENGTH:
+        raise ValueError(length)
+    return length
+
+
+def encode_report(game_server_id: int, report: schemas.GameServerReport) -> bytes:
+    """
+    Encode and sign a report frame, as a game server would. ``timeout`` is sent in whole seconds.
+    :param game_server_id:
+    :param report:
+    :return:
+    """
+    flags = 0
+    game_time = day_length = night_length = 0
+    if report.game_time is not None:
+        flags |= FLAG_GAME_TIME
+        game_time = (report.game_time - EPOCH) // MICROSECOND
+    if report.day_length is not None:
+        flags |= FLAG_DAY_LENGTH
+        day_length = report.day_length.total_seconds() / 60
+    if report.night_length is not None:
+        flags |= FLAG_NIGHT_LENGTH
+        night_length = report.night_length.total_seconds() / 60
+    timeout = int(report.timeout.total_seconds()) if report.timeout is not None else 0
+    frame = FRAME.pack(MAGIC, VERSION, game_server_id, common.STATE_CODES.index(report.state), flags,
+                       report.player_count, report.max_player_count or 0, timeout, game_time, day_length,
+                       night_length, bytes(MAC_SIZE))
+    return frame[SIGNED] + _mac(game_server_id, frame[SIGNED])
+
+
+def encode_ack(game_server_id: int, result: Result) -> bytes:
+    return ACK.pack(MAGIC, VERSION, game_server_id, result)
@@ -0,0 +1,57 @@
+from typing import Optional
+
+import sortedcontainers
+
+from . import common, models
+
+
+class LoadIndex:
+    """
+    RUNNING servers that are not full, least loaded first, kept sorted as reports come in (O(log n) per change).
+    Servers reporting ``max_player_count`` are ordered by player_count / max_player_count; the others come after
+    them, ordered by player_count.
+    """
+
+    def __init__(self):
+        self._keys: dict[int, tuple[int, float]] = {}
+        self._sorted: sortedcontainers.SortedList[tuple[int, float, int]] = sortedcontainers.SortedList()
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    @staticmethod
+    def key(status: models.GameServerStatus) -> Optional[tuple[int, float]]:
+        """
+        :return: None if the server should not be recommended
+        """
+        if status.state != common.GameServerStateEnum.RUNNING:
+            return None
+        if status.max_player_count:
+            if status.player_count >= status.max_player_count:
+                return None
+            return 0, status.player_count / status.max_player_count
+        return 1, status.player_count
+
+    def update(self, game_server_id: int, status: models.GameServerStatus) -> None:
+        key = self.key(status)
+        old = self._keys.get(game_server_id)
+        if old == key:
+            return
+        if old is not None:
+            self._sorted.remove((*old, game_server_id))
+        if key is None:
+            del self._keys[game_server_id]
+        else:
+            self._keys[game_server_id] = key
+            self._sorted.add((*key, game_server_id))
+
+    def remove(self, game_server_id: int) -> None:
+        old = self._keys.pop(game_server_id, None)
+        if old is not None:
+            self._sorted.remove((*old, game_server_id))
+
+    def slice(self, start: int, stop: int) -> list[int]:
+        """
+        :return: ids of the servers ranked ``start`` (inclusive) to ``stop`` (exclusive), in O(log n + stop - start)
+        """
+        return [game_server_id for *_, game_server_id in self._sorted.islice(start, stop)]
@@ -1,30 +1,187 @@
+from typing import Any, Optional
+
 import fastapi
+import fastapi.responses
+import pydantic
 from fastapi import APIRouter
 
-import universal.database
+import universal.rate_limit
 from . import crud, schemas
 from .. import crud as game_server_crud
 
 router = APIRouter()
 
+# 正常的服务器最快 5 秒上报一次
+report_rate_limit = universal.rate_limit.RateLimit(
+    "report", 1, 5, lambda request: f"{request.path_params['game_server_id']}:{request.client.host}")
+batch_report_rate_limit = universal.rate_limit.RateLimit("batch_report", 1, 5)
+MAX_BATCH_REPORTS = 1000
+"""一次批量上报最多包含的游戏服务器数"""
+
+
+def check_user_agent(request: fastapi.Request) -> None:
+    if not request.headers.get("User-Agent", "").startswith("Rdfz3D HTTP Client"):
+        raise fastapi.HTTPException(status_code=fastapi.status.HTTP_401_UNAUTHORIZED,
+                                    detail="Reports should come from Rdfz3D servers")
+
+
+@router.post(
+    "/report",
+    description=f"批量报告多个游戏服务器的状态，请求体以游戏服务器 id 为键，最多 {MAX_BATCH_REPORTS} 个。"
+                "每个游戏服务器的结果单独返回，单个上报不合法时只有它的结果为 422。",
+    responses={
+        fastapi.status.HTTP_401_UNAUTHORIZED: {"description": "UA 不正确"},
+        fastapi.status.HTTP_422_UNPROCESSABLE_ENTITY: {
+            "description": f"请求体不是以游戏服务器 id 为键的对象，或超过 {MAX_BATCH_REPORTS} 个游戏服务器"},
+        fastapi.status.HTTP_429_TOO_MANY_REQUESTS: {"description": "上报过于频繁"},
+    },
+    dependencies=[fastapi.Depends(batch_report_rate_limit)],
+)
+async def report_game_server_statuses(request: fastapi.Request,
+                                      report_body: dict[int, Any] = fastapi.Body(max_length=MAX_BATCH_REPORTS),
+                                      ) -> dict[int, schemas.GameServerBatchReportResult]:
+    check_user_agent(request)
+    results = {}
+    reports = {}
+    # 逐个校验，一个不合法的上报不影响其他
+    for game_server_id, report in report_body.items():
+        try:
+            reports[game_server_id] = schemas.GameServerReport.model_validate(report)
+        except pydantic.ValidationError as e:
+            results[game_server_id] = schemas.GameServerBatchReportResult(
+                status_code=fastapi.status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="; ".join(f"{'.'.join(map(str, error['loc'])) or 'body'}: {error['msg']}"
+                                 for error in e.errors()))
+    reporter_hosts = await game_server_crud.get_reporter_hosts(reports.keys())
+    accepted = {}
+    for game_server_id, report in reports.items():
+        exists, reporter_host = reporter_hosts[game_server_id]
+        if not exists:
+            results[game_server_id] = schemas.GameServerBatchReportResult(
+                status_code=fastapi.status.HTTP_404_NOT_FOUND, detail="Game server not found")
+        elif request.client.host != reporter_host:
+            results[game_server_id] = schemas.GameServerBatchReportResult(
+                status_code=fastapi.status.HTTP_403_FORBIDDEN, detail="Host mismatch")
+        else:
+            accepted[game_server_id] = report
+    for game_server_id, result in crud.report_server_statuses(accepted).items():
+        results[game_server_id] = schemas.GameServerBatchReportResult(interval=result.interval,
+                                                                      expires_at=result.expires_at)
+    return results
+
 
 @router.post(
     "/report/{game_server_id}",
-    description="游戏服务器向此报告状态。如果 15 秒内没有收到报告，则认为服务器 stopped。",
+    description="游戏服务器向此报告状态。如果 timeout（15 到 300，默认 15）秒内没有收到报告，则认为服务器 stopped。"
+                "读取时 game_time 会按 day_length / night_length 推算到当前时间，因此不必为了刷新时钟而频繁上报。"
+                "返回下次上报的建议间隔 interval 和过期时间 expires_at，上报较多时后端会拉长 interval 并相应延后 expires_at。",
     responses={
         fastapi.status.HTTP_401_UNAUTHORIZED: {"description": "UA 不正确"},
         fastapi.status.HTTP_403_FORBIDDEN: {"description": "请求的 Host 与游戏服务器的 reporter_host 不匹配"},
+        fastapi.status.HTTP_404_NOT_FOUND: {"description": "Game server not found"},
+        fastapi.status.HTTP_429_TOO_MANY_REQUESTS: {"description": "上报过于频繁"},
     },
+    dependencies=[fastapi.Depends(report_rate_limit)],
 )
 async def report_game_server_status(request: fastapi.Request,
                                     game_server_id: int,
                                     report_body: schemas.GameServerReport,
-                                    db_session=fastapi.Depends(universal.database.get_async_session),
-                                    ) -> None:
-    game_server = await game_server_crud.get_game_server(db_session, game_server_id)
-    if not request.headers.get("User-Agent").startswith("Rdfz3D HTTP Client"):
-        raise fastapi.HTTPException(status_code=fastapi.status.HTTP_401_UNAUTHORIZED,
-                                    detail="Reports should come from Rdfz3D servers")
-    if request.client.host != game_server.reporter_host:
+                                    ) -> schemas.GameServerReportAccepted:
+    check_user_agent(request)
+    exists, reporter_host = await game_server_crud.get_reporter_host(game_server_id)
+    if not exists:
+        raise fastapi.HTTPException(status_code=fastapi.status.HTTP_404_NOT_FOUND, detail="Game server not found")
+    if request.client.host != reporter_host:
         raise fastapi.HTTPException(status_code=fastapi.status.HTTP_403_FORBIDDEN, detail="Host mismatch")
-    crud.report_server_status(game_server_id, report_body)
+    return crud.report_server_status(game_server_id, report_body)
+
+
+@router.get(
+    "/status/events",
+    description="Server-Sent Events：连接时发送 snapshot（所有未停止的游戏服务器状态），之后合并发送 delta（状态变化，"
+                "服务器停止）。使用共享的状态存储时，其他 worker 收到的上报也会推送。",
+    response_class=fastapi.responses.StreamingResponse,
+)
+async def stream_game_server_status_events() -> fastapi.responses.StreamingResponse:
+    subscriber, snapshot = crud.broadcaster.subscribe(crud.snapshot_statuses)
+
+    async def event_stream():
+        try:
+            yield snapshot.sse
+            while (message := await subscriber.get()) is not None:
+                yield message.sse
+        finally:
+            crud.broadcaster.unsubscribe(subscriber)
+
+    return fastapi.responses.StreamingResponse(event_stream(), media_type="text/event-stream",
+                                               headers={"Cache-Control": "no-cache"})
+
+
+@router.websocket("/status/ws")
+async def game_server_status_websocket(websocket: fastapi.WebSocket) -> None:
+    """与 ``/status/events`` 相同的消息，以 WebSocket 文本帧发送"""
+    await websocket.accept()
+    subscriber, snapshot = crud.broadcaster.subscribe(crud.snapshot_statuses)
+    try:
+        await websocket.send_text(snapshot.text)
+        while (message := await subscriber.get()) is not None:
+            await websocket.send_text(message.text)
+        await websocket.close()
+    except fastapi.WebSocketDisconnect:
+        pass
+    finally:
+        crud.broadcaster.unsubscribe(subscriber)
+
+
+@router.get(
+    "/{game_server_id}/status/wait",
+    description="长轮询，用于无法使用 WebSocket 的客户端。状态在 generation 为 since 之后变化过则立即返回，"
+                "否则等待变化或 timeout 秒后返回。返回的 generation 作为下次请求的 since；首次请求 since=0。"
+                "使用共享的状态存储时，其他 worker 收到的上报引起的变化至多延迟 status_event_window 秒唤醒。",
+    responses={
+        fastapi.status.HTTP_404_NOT_FOUND: {"description": "Game server not found"},
+    },
+)
+async def wait_game_server_status(
+        game_server_id: int,
+        since: int = fastapi.Query(default=0, ge=0, description="上次返回的 generation"),
+        timeout: float = fastapi.Query(default=30, ge=0, le=60, description="最多等待_秒"),
+) -> schemas.GameServerStatusWait:
+    exists, _ = await game_server_crud.get_reporter_host(game_server_id)
+    if not exists:
+        raise fastapi.HTTPException(status_code=fastapi.status.HTTP_404_NOT_FOUND, detail="Game server not found")
+    return await crud.wait_server_status(game_server_id, since, timeout)
+
+
+@router.get(
+    "/{game_server_id}/status/history",
+    description="游戏服务器的玩家数和状态历史。历史保存在每个 worker 的内存中，只包含本 worker 收到的上报，"
+                "重启后清空；多 worker 部署时应让同一服务器的上报固定发往同一 worker（如按来源 IP 分配），"
+                "否则各 worker 返回的历史不同。",
+    responses={
+        fastapi.status.HTTP_404_NOT_FOUND: {"description": "Game server not found"},
+    },
+)
+async def get_game_server_status_history(
+        game_server_id: int,
+        range_seconds: int = fastapi.Query(default=3600, ge=1, alias="range", description="最近_秒"),
+        resolution: Optional[int] = fastapi.Query(default=None, ge=1,
+                                                  description="每个点至少_秒，可选 15, 60, 900, 3600；默认自动选择"),
+) -> schemas.GameServerStatusHistory:
+    exists, _ = await game_server_crud.get_reporter_host(game_server_id)
+    if not exists:
+        raise fastapi.HTTPException(status_code=fastapi.status.HTTP_404_NOT_FOUND, detail="Game server not found")
+    return crud.get_server_status_history(game_server_id, range_seconds, resolution)
+
+
+@router.get(
+    "/stats",
+    description="正在上报（未超时）的游戏服务器的玩家总数、各状态服务器数和各管理员的服务器数、玩家数。",
+)
+async def get_game_server_stats() -> schemas.GameServerStats:
+    return crud.get_stats()
+
+
+@router.get("/status/metrics")
+async def get_game_server_report_counters() -> schemas.GameServerReportCounters:
+    return crud.get_report_counters()
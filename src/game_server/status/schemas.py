@@ -5,6 +5,8 @@ from typing import Any, Optional, Annotated
 import pydantic
 
 from .. import models
+from . import common, clock
+from . import models as status_models
 from .models import GameServerStatusBase
 
 
@@ -18,8 +20,30 @@ def minutes_to_seconds_validator(value: Any) -> Any:
 
 class GameServerReport(GameServerStatusBase):
     """游戏服务器上报状态的 schema"""
-    day_length: Annotated[Optional[datetime.timedelta], pydantic.BeforeValidator(minutes_to_seconds_validator)] = None
-    night_length: Annotated[Optional[datetime.timedelta], pydantic.BeforeValidator(minutes_to_seconds_validator)] = None
+    day_length: Annotated[Optional[datetime.timedelta], pydantic.BeforeValidator(minutes_to_seconds_validator)] = \
+        pydantic.Field(default=None, ge=status_models.MIN_PHASE_LENGTH, le=status_models.MAX_PHASE_LENGTH,
+                       description="白天在现实中持续的分钟数，1/6 到 1440")
+    night_length: Annotated[Optional[datetime.timedelta], pydantic.BeforeValidator(minutes_to_seconds_validator)] = \
+        pydantic.Field(default=None, ge=status_models.MIN_PHASE_LENGTH, le=status_models.MAX_PHASE_LENGTH,
+                       description="夜晚在现实中持续的分钟数，1/6 到 1440")
+    timeout: Optional[datetime.timedelta] = pydantic.Field(
+        default=None, ge=status_models.MIN_REPORT_TIMEOUT, le=status_models.MAX_REPORT_TIMEOUT,
+        description="超过_秒没有上报则认为服务器 stopped，15 到 300，默认 15（最短上报间隔 5 秒的 3 倍）。"
+                    "上报间隔较长的服务器可以调大。负载较高时后端会把它延长到返回的 interval 的 3 倍")
+
+
+class GameServerReportAccepted(pydantic.BaseModel):
+    """上报成功后返回给游戏服务器的下次上报时间"""
+    interval: float = pydantic.Field(description="建议在_秒后再次上报，由后端按当前上报负载决定")
+    expires_at: datetime.datetime = pydantic.Field(description="在此之前没有再次上报则认为服务器 stopped")
+
+
+class GameServerBatchReportResult(pydantic.BaseModel):
+    """批量上报中单个游戏服务器的结果"""
+    status_code: int = 200
+    detail: Optional[str] = None
+    interval: Optional[float] = pydantic.Field(default=None, description="同 GameServerReportAccepted，仅上报成功时有")
+    expires_at: Optional[datetime.datetime] = None
 
 
 def timedelta_to_minutes_validator(value: Any) -> Any:
@@ -33,3 +57,55 @@ class GameServerStatusRead(GameServerStatusBase):
     """请求游戏服务器状态的 schema"""
     day_length: Annotated[Optional[float], pydantic.BeforeValidator(timedelta_to_minutes_validator)] = None
     night_length: Annotated[Optional[float], pydantic.BeforeValidator(timedelta_to_minutes_validator)] = None
+    is_day: Optional[bool] = pydantic.Field(default=None, description="game_time 是否为白天（06:00–18:00）")
+
+    @classmethod
+    def from_status(cls, status: status_models.GameServerStatus,
+                    now: Optional[datetime.datetime] = None) -> "GameServerStatusRead":
+        """
+        Read a stored status, with ``game_time`` extrapolated from the last report to ``now``.
+        :param status:
+        :param now:
+        :return:
+        """
+        result = cls.model_validate(status, from_attributes=True)
+        if status.game_time is not None and status.last_updated is not None:
+            elapsed = max((now or datetime.datetime.now()) - status.last_updated, datetime.timedelta())
+            result.game_time = clock.advance(status.game_time, elapsed, status.day_length,
+                                             status.night_length) or status.game_time
+        if result.game_time is not None:
+            result.is_day = clock.is_day(result.game_time)
+        return result
+
+
+class GameServerStatusWait(pydantic.BaseModel):
+    """长轮询的结果"""
+    generation: int = pydantic.Field(description="下次请求时作为 since 传入")
+    status: GameServerStatusRead
+
+
+class GameServerStatusHistory(pydantic.BaseModel):
+    """游戏服务器状态历史，按时间排列的并列数组。每个时间段取玩家数峰值和最后的状态"""
+    resolution: int = pydantic.Field(description="每个点代表的秒数")
+    timestamps: list[int] = pydantic.Field(description="各时间段起点的 unix 时间戳")
+    player_counts: list[int]
+    states: list[common.GameServerStateEnum]
+
+
+class GameServerReportCounters(pydantic.BaseModel):
+    """本 worker 启动以来处理的上报数"""
+    fast_path: int = pydantic.Field(description="与已有状态相同，只刷新了 last_updated 的上报")
+    full: int = pydantic.Field(description="完整处理的上报")
+
+
+class GameServerAdminStats(pydantic.BaseModel):
+    server_count: int
+    player_count: int
+
+
+class GameServerStats(pydantic.BaseModel):
+    """正在上报的游戏服务器的统计"""
+    server_count: int
+    player_count: int = pydantic.Field(description="玩家总数")
+    state_counts: dict[common.GameServerStateEnum, int] = pydantic.Field(description="各状态的服务器数")
+    admins: dict[str, GameServerAdminStats] = pydantic.Field(description="按管理员 id 统计，不含没有管理员的服务器")
@@ -0,0 +1,90 @@
+"""
+重启前后保存、恢复上报的状态。文件为一个紧凑的 JSON 对象::
+
+    {"version": 1, "statuses": {"<id>": GameServerStatus, ...}, "generations": {"<id>": generation, ...}}
+
+先写入临时文件再替换，崩溃时不会留下不完整的快照。多个 worker 时只有持有 ``<path>.lock`` 的一个写入。
+"""
+import fcntl
+import json
+import os
+import pathlib
+import tempfile
+from typing import Any, Optional, TextIO
+
+import pydantic
+
+from . import models
+
+VERSION = 1
+
+_lock_file: Optional[TextIO] = None
+
+
+def encode(statuses: list[tuple[int, models.GameServerStatus]], generations: dict[int, int]) -> bytes:
+    """
+    Serialize a snapshot. Cheap enough to do on the event loop, unlike writing it.
+    :param statuses: (game_server_id, status)
+    :param generations: game_server_id -> generation
+    :return:
+    """
+    document: dict[str, Any] = {
+        "version": VERSION,
+        "statuses": {game_server_id: status.model_dump(mode="json") for game_server_id, status in statuses},
+        "generations": generations,
+    }
+    return json.dumps(document, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def is_writer(path: pathlib.Path) -> bool:
+    """
+    Whether this worker writes the snapshot at ``path``. The first worker to ask takes an exclusive lock on
+    ``<path>.lock`` and keeps it until it exits, so the others neither race it nor overwrite the file with a
+    partial view of a per-worker store.
+    :param path:
+    :return:
+    """
+    global _lock_file
+    if _lock_file is not None:
+        return True
+    lock_file = open(path.with_name(path.name + ".lock"), "w")
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        lock_file.close()
+        return False
+    _lock_file = lock_file
+    return True
+
+
+def write(path: pathlib.Path, data: bytes) -> None:
+    with tempfile.NamedTemporaryFile(dir=path.parent, prefix=path.name + ".", suffix=".tmp", delete=False) as f:
+        f.write(data)
+    try:
+        os.replace(f.name, path)
+    except OSError:
+        os.unlink(f.name)
+        raise
+
+
+def read(path: pathlib.Path) -> tuple[dict[int, models.GameServerStatus], dict[int, int]]:
+    """
+    :param path:
+    :return: (game_server_id -> status, game_server_id -> generation), both empty if there is no usable snapshot
+    """
+    try:
+        with open(path, "rb") as f:
+            document = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}, {}
+    if document.get("version") != VERSION:
+        return {}, {}
+    statuses = {}
+    for game_server_id, status in document["statuses"].items():
+        try:
+            statuses[int(game_server_id)] = models.GameServerStatus.model_validate(status)
+        except pydantic.ValidationError:
+            # 旧版本保存的、不再合法的状态
+            continue
+    generations = {int(game_server_id): generation for game_server_id, generation in document["generations"].items()}
+    return statuses, generations
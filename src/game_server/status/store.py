@@ -0,0 +1,500 @@
+import abc
+import datetime
+import heapq
+import pathlib
+import sqlite3
+from typing import Optional
+
+from . import common, models, ranking
+
+DEFAULT_TIMEOUT = models.MIN_REPORT_TIMEOUT
+
+
+class StatusStore(abc.ABC):
+    """
+    Where reported game server statuses live.
+    ``MemoryStatusStore`` is private to the process; ``SQLiteStatusStore`` is shared by every worker on the host.
+    """
+    shared = False
+    """其他 worker 的上报和过期是否也会出现在这里"""
+
+    def __init__(self, timeout: datetime.timedelta = DEFAULT_TIMEOUT):
+        self.timeout = timeout
+
+    @abc.abstractmethod
+    def __len__(self) -> int:
+        ...
+
+    @abc.abstractmethod
+    def __contains__(self, game_server_id: int) -> bool:
+        ...
+
+    @abc.abstractmethod
+    def get(self, game_server_id: int) -> Optional[models.GameServerStatus]:
+        ...
+
+    @abc.abstractmethod
+    def put(self, game_server_id: int, status: models.GameServerStatus) -> None:
+        """
+        Insert or replace the status of a server.
+        :param game_server_id:
+        :param status:
+        :return:
+        """
+
+    def get_many(self, game_server_ids: list[int]) -> dict[int, models.GameServerStatus]:
+        """
+        Get the statuses of many servers at once. Servers not in the store are left out.
+        :param game_server_ids:
+        :return: game_server_id -> status
+        """
+        result = {}
+        for game_server_id in game_server_ids:
+            status = self.get(game_server_id)
+            if status is not None:
+                result[game_server_id] = status
+        return result
+
+    def put_many(self, statuses: dict[int, models.GameServerStatus]) -> None:
+        """
+        Insert or replace the statuses of many servers at once.
+        :param statuses: game_server_id -> status
+        :return:
+        """
+        for game_server_id, status in statuses.items():
+            self.put(game_server_id, status)
+
+    @abc.abstractmethod
+    def items(self) -> list[tuple[int, models.GameServerStatus]]:
+        ...
+
+    @abc.abstractmethod
+    def remove(self, game_server_id: int) -> Optional[models.GameServerStatus]:
+        ...
+
+    @abc.abstractmethod
+    def expire(self, now: Optional[datetime.datetime] = None) -> list[int]:
+        """
+        Drop every entry whose deadline has passed.
+        :param now:
+        :return: ids of the dropped servers
+        """
+
+    @abc.abstractmethod
+    def bump_generation(self, game_server_id: int) -> int:
+        """
+        Record a visible change of a server's status (including going STOPPED).
+        :param game_server_id:
+        :return: the new generation, greater than every generation handed out before
+        """
+
+    @abc.abstractmethod
+    def get_generations(self, game_server_ids: list[int]) -> dict[int, int]:
+        """
+        :param game_server_ids:
+        :return: game_server_id -> generation of its last visible change, 0 if never reported
+        """
+
+    @abc.abstractmethod
+    def all_generations(self) -> dict[int, int]:
+        """
+        :return: game_server_id -> generation, for every server that has one
+        """
+
+    @abc.abstractmethod
+    def restore(self, statuses: dict[int, models.GameServerStatus], generations: dict[int, int]) -> list[int]:
+        """
+        Put back statuses and generations saved before a restart. Servers already in the store are left alone,
+        since whatever is there is newer.
+        :param statuses: game_server_id -> status
+        :param generations: game_server_id -> generation
+        :return: ids of the restored statuses
+        """
+
+    @abc.abstractmethod
+    def running_ids(self, now: Optional[datetime.datetime] = None) -> list[int]:
+        """
+        Ids of the servers whose deadline has not passed and are not STOPPED.
+        :param now:
+        :return:
+        """
+
+    @abc.abstractmethod
+    def next_deadline(self) -> Optional[datetime.datetime]:
+        """
+        When the earliest entry expires.
+        :return: None if the store is empty
+        """
+
+    def set_admin(self, game_server_id: int, admin_id: Optional[str]) -> None:
+        """
+        Record who administrates a server, for ``totals``. Only shared stores keep totals; per-process stores leave
+        them to ``aggregates.StatusAggregates``.
+        :param game_server_id:
+        :param admin_id:
+        :return:
+        """
+
+    def forget(self, game_server_id: int) -> None:
+        """
+        Drop everything known about a deleted server: its status, admin and generation.
+        Shared stores keep the generation, so that the other workers see the server stop (see ``generations_since``).
+        :param game_server_id:
+        :return:
+        """
+        self.remove(game_server_id)
+
+    def totals(self) -> tuple[dict[common.GameServerStateEnum, tuple[int, int]], dict[str, tuple[int, int]]]:
+        """
+        Server and player counts of the servers in the store, kept up to date by every write. Shared stores only.
+        :return: (state -> (server_count, player_count), admin_id -> (server_count, player_count))
+        """
+        raise NotImplementedError
+
+    def ranked_ids(self, start: int, stop: int) -> list[int]:
+        """
+        Ids of RUNNING servers that are not full, least loaded first (see ``ranking.LoadIndex.key``).
+        Shared stores only.
+        :param start:
+        :param stop:
+        :return:
+        """
+        raise NotImplementedError
+
+    def generations_since(self, generation: Optional[int]) -> tuple[int, dict[int, int]]:
+        """
+        The servers whose status changed after ``generation``, in any worker. Shared stores only.
+        :param generation: the latest generation seen so far; None to only get the current latest one
+        :return: (latest generation, game_server_id -> generation of the servers changed since)
+        """
+        raise NotImplementedError
+
+    def deadline(self, status: models.GameServerStatus) -> datetime.datetime:
+        """
+        When a status expires: ``last_updated`` plus the timeout reported by the server, or ``timeout`` by default.
+        :param status:
+        :return:
+        """
+        if status.last_updated is None:
+            return datetime.datetime.min
+        return status.last_updated + (status.timeout or self.timeout)
+
+    def is_fresh(self, status: models.GameServerStatus, now: Optional[datetime.datetime] = None) -> bool:
+        """
+        Whether a status has not reached its deadline.
+        :param status:
+        :param now:
+        :return:
+        """
+        return (now or datetime.datetime.now()) < self.deadline(status)
+
+
+class MemoryStatusStore(StatusStore):
+    """
+    Reported game server statuses in this process, with a heap of deadlines.
+    Upserting pushes the new deadline (O(log n)) and leaves the old one in the heap to be skipped when popped;
+    the heap is rebuilt when skipped entries pile up, so expiring stays O(log n) amortized.
+    """
+
+    def __init__(self, timeout: datetime.timedelta = DEFAULT_TIMEOUT):
+        super().__init__(timeout)
+        self._entries: dict[int, models.GameServerStatus] = {}
+        self._deadlines: dict[int, datetime.datetime] = {}
+        self._heap: list[tuple[datetime.datetime, int]] = []
+        self._generation = 0
+        self._generations: dict[int, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, game_server_id: int) -> bool:
+        return game_server_id in self._entries
+
+    def get(self, game_server_id: int) -> Optional[models.GameServerStatus]:
+        return self._entries.get(game_server_id)
+
+    def put(self, game_server_id: int, status: models.GameServerStatus) -> None:
+        self._entries[game_server_id] = status
+        deadline = self.deadline(status)
+        if self._deadlines.get(game_server_id) != deadline:
+            self._deadlines[game_server_id] = deadline
+            heapq.heappush(self._heap, (deadline, game_server_id))
+            if len(self._heap) > 4 * len(self._deadlines) + 64:
+                self._heap = [(deadline, game_server_id) for game_server_id, deadline in self._deadlines.items()]
+                heapq.heapify(self._heap)
+
+    def items(self) -> list[tuple[int, models.GameServerStatus]]:
+        return list(self._entries.items())
+
+    def remove(self, game_server_id: int) -> Optional[models.GameServerStatus]:
+        self._deadlines.pop(game_server_id, None)
+        return self._entries.pop(game_server_id, None)
+
+    def expire(self, now: Optional[datetime.datetime] = None) -> list[int]:
+        now = now or datetime.datetime.now()
+        expired = []
+        while self._heap and self._heap[0][0] <= now:
+            deadline, game_server_id = heapq.heappop(self._heap)
+            if self._deadlines.get(game_server_id) == deadline:
+                del self._deadlines[game_server_id]
+                del self._entries[game_server_id]
+                expired.append(game_server_id)
+        return expired
+
+    def bump_generation(self, game_server_id: int) -> int:
+        self._generation += 1
+        self._generations[game_server_id] = self._generation
+        return self._generation
+
+    def get_generations(self, game_server_ids: list[int]) -> dict[int, int]:
+        return {game_server_id: self._generations.get(game_server_id, 0) for game_server_id in game_server_ids}
+
+    def all_generations(self) -> dict[int, int]:
+        return dict(self._generations)
+
+    def restore(self, statuses: dict[int, models.GameServerStatus], generations: dict[int, int]) -> list[int]:
+        restored = [game_server_id for game_server_id in statuses if game_server_id not in self._entries]
+        for game_server_id in restored:
+            self.put(game_server_id, statuses[game_server_id])
+        for game_server_id, generation in generations.items():
+            self._generations.setdefault(game_server_id, generation)
+        # 新的 generation 必须大于重启前发出的所有 generation，否则旧的 ETag 可能误匹配
+        self._generation = max(self._generation, *generations.values(), 0)
+        return restored
+
+    def running_ids(self, now: Optional[datetime.datetime] = None) -> list[int]:
+        now = now or datetime.datetime.now()
+        return [game_server_id for game_server_id, status in self._entries.items()
+                if status.state != common.GameServerStateEnum.STOPPED and self.is_fresh(status, now)]
+
+    def forget(self, game_server_id: int) -> None:
+        self.remove(game_server_id)
+        self._generations.pop(game_server_id, None)
+
+    def next_deadline(self) -> Optional[datetime.datetime]:
+        while self._heap and self._deadlines.get(self._heap[0][1]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
+        return self._heap[0][0] if self._heap else None
+
+
+class SQLiteStatusStore(StatusStore):
+    """
+    Reported game server statuses in a SQLite database in WAL mode, shared by every worker on the host.
+    Readers never block the writer, and with ``synchronous=OFF`` on a tmpfs path a report costs a few microseconds.
+    Statuses are only heartbeats, so losing the last few on a crash is fine, and so is dropping them
+    when ``SCHEMA_VERSION`` changes.
+
+    Besides the JSON of each status, a row keeps the columns needed by ``totals`` and ``ranked_ids``, so that neither
+    parses JSON: triggers keep per-state and per-admin counts in ``game_server_status_total`` as rows are written,
+    and a partial index keeps the recommendable servers sorted by load.
+    """
+    SCHEMA_VERSION = 3
+    shared = True
+
+    _UPSERT = ("INSERT INTO game_server_status "
+               "(id, deadline, status, state, player_count, rank_group, rank_value, admin_id) "
+               "VALUES (?, ?, ?, ?, ?, ?, ?, (SELECT admin_id FROM game_server_admin WHERE id = ?)) ")
+    _PUT = _UPSERT + ("ON CONFLICT (id) DO UPDATE SET deadline = excluded.deadline, status = excluded.status, "
+                      "state = excluded.state, player_count = excluded.player_count, rank_group = excluded.rank_group, "
+                      "rank_value = excluded.rank_value, admin_id = excluded.admin_id")
+
+    def __init__(self, path: pathlib.Path, timeout: datetime.timedelta = DEFAULT_TIMEOUT):
+        super().__init__(timeout)
+        self.path = path
+        self._connection = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=OFF")
+        self._connection.execute("PRAGMA busy_timeout=1000")
+        with self._connection:
+            self._connection.execute("BEGIN IMMEDIATE")
+            if self._connection.execute("PRAGMA user_version").fetchone()[0] != self.SCHEMA_VERSION:
+                for table in ("game_server_status", "game_server_generation", "game_server_admin",
+                              "game_server_status_total"):
+                    self._connection.execute(f"DROP TABLE IF EXISTS {table}")
+                self._connection.execute(f"PRAGMA user_version={self.SCHEMA_VERSION}")
+            self._create_tables()
+
+    def _create_tables(self) -> None:
+        self._connection.execute("CREATE TABLE IF NOT EXISTS game_server_status ("
+                                 "id INTEGER PRIMARY KEY, deadline REAL NOT NULL, status TEXT NOT NULL, "
+                                 "state TEXT NOT NULL, player_count INTEGER NOT NULL, "
+                                 "rank_group INTEGER, rank_value REAL, admin_id TEXT)")
+        self._connection.execute("CREATE INDEX IF NOT EXISTS ix_game_server_status_deadline "
+                                 "ON game_server_status (deadline)")
+        self._connection.execute("CREATE INDEX IF NOT EXISTS ix_game_server_status_rank "
+                                 "ON game_server_status (rank_group, rank_value, id) WHERE rank_group IS NOT NULL")
+        # 与状态分开存放，服务器 STOPPED 被删除后仍保留
+        self._connection.execute("CREATE TABLE IF NOT EXISTS game_server_generation ("
+                                 "id INTEGER PRIMARY KEY, generation INTEGER NOT NULL)")
+        self._connection.execute("CREATE INDEX IF NOT EXISTS ix_game_server_generation_generation "
+                                 "ON game_server_generation (generation)")
+        self._connection.execute("CREATE TABLE IF NOT EXISTS game_server_admin ("
+                                 "id INTEGER PRIMARY KEY, admin_id TEXT)")
+        # kind 为 'state' 时 key 为状态，为 'admin' 时 key 为管理员 id
+        self._connection.execute("CREATE TABLE IF NOT EXISTS game_server_status_total ("
+                                 "kind TEXT NOT NULL, key TEXT NOT NULL, server_count INTEGER NOT NULL, "
+                                 "player_count INTEGER NOT NULL, PRIMARY KEY (kind, key))")
+        add = ("INSERT INTO game_server_status_total (kind, key, server_count, player_count) "
+               "SELECT 'state', NEW.state, 1, NEW.player_count WHERE true "
+               "UNION ALL SELECT 'admin', NEW.admin_id, 1, NEW.player_count WHERE NEW.admin_id IS NOT NULL "
+               "ON CONFLICT (kind, key) DO UPDATE SET server_count = server_count + 1, "
+               "player_count = player_count + excluded.player_count;")
+        subtract = ("UPDATE game_server_status_total SET server_count = server_count - 1, "
+                    "player_count = player_count - OLD.player_count "
+                    "WHERE (kind = 'state' AND key = OLD.state) OR (kind = 'admin' AND key = OLD.admin_id);")
+        self._connection.execute("CREATE TRIGGER IF NOT EXISTS game_server_status_insert "
+                                 f"AFTER INSERT ON game_server_status BEGIN {add} END")
+        self._connection.execute("CREATE TRIGGER IF NOT EXISTS game_server_status_delete "
+                                 f"AFTER DELETE ON game_server_status BEGIN {subtract} END")
+        self._connection.execute("CREATE TRIGGER IF NOT EXISTS game_server_status_update "
+                                 "AFTER UPDATE OF state, player_count, admin_id ON game_server_status "
+                                 "WHEN OLD.state IS NOT NEW.state OR OLD.player_count != NEW.player_count "
+                                 f"OR OLD.admin_id IS NOT NEW.admin_id BEGIN {subtract} {add} END")
+
+    def __len__(self) -> int:
+        return self._connection.execute("SELECT COUNT(*) FROM game_server_status").fetchone()[0]
+
+    def __contains__(self, game_server_id: int) -> bool:
+        return self._connection.execute("SELECT 1 FROM game_server_status WHERE id = ?",
+                                        (game_server_id,)).fetchone() is not None
+
+    def get(self, game_server_id: int) -> Optional[models.GameServerStatus]:
+        row = self._connection.execute("SELECT status FROM game_server_status WHERE id = ?",
+                                       (game_server_id,)).fetchone()
+        return models.GameServerStatus.model_validate_json(row[0]) if row else None
+
+    def get_many(self, game_server_ids: list[int]) -> dict[int, models.GameServerStatus]:
+        if not game_server_ids:
+            return {}
+        placeholders = ",".join("?" * len(game_server_ids))
+        rows = self._connection.execute(f"SELECT id, status FROM game_server_status WHERE id IN ({placeholders})",
+                                        game_server_ids).fetchall()
+        return {game_server_id: models.GameServerStatus.model_validate_json(status) for game_server_id, status in rows}
+
+    def _deadline_timestamp(self, status: models.GameServerStatus) -> float:
+        return self.deadline(status).timestamp() if status.last_updated else 0.0
+
+    def _row(self, game_server_id: int, status: models.GameServerStatus) -> tuple:
+        rank = ranking.LoadIndex.key(status) or (None, None)
+        return (game_server_id, self._deadline_timestamp(status), status.model_dump_json(), status.state.value,
+                status.player_count, *rank, game_server_id)
+
+    def put(self, game_server_id: int, status: models.GameServerStatus) -> None:
+        self._connection.execute(self._PUT, self._row(game_server_id, status))
+
+    def put_many(self, statuses: dict[int, models.GameServerStatus]) -> None:
+        with self._connection:
+            self._connection.execute("BEGIN")
+            self._connection.executemany(self._PUT, (self._row(game_server_id, status)
+                                                     for game_server_id, status in statuses.items()))
+
+    def items(self) -> list[tuple[int, models.GameServerStatus]]:
+        return [(game_server_id, models.GameServerStatus.model_validate_json(status)) for game_server_id, status
+                in self._connection.execute("SELECT id, status FROM game_server_status").fetchall()]
+
+    def remove(self, game_server_id: int) -> Optional[models.GameServerStatus]:
+        row = self._connection.execute("DELETE FROM game_server_status WHERE id = ? RETURNING status",
+                                       (game_server_id,)).fetchone()
+        return models.GameServerStatus.model_validate_json(row[0]) if row else None
+
+    def expire(self, now: Optional[datetime.datetime] = None) -> list[int]:
+        rows = self._connection.execute("DELETE FROM game_server_status WHERE deadline <= ? RETURNING id",
+                                        ((now or datetime.datetime.now()).timestamp(),)).fetchall()
+        return [row[0] for row in rows]
+
+    def bump_generation(self, game_server_id: int) -> int:
+        return self._connection.execute(
+            "INSERT INTO game_server_generation (id, generation) "
+            "VALUES (?, (SELECT COALESCE(MAX(generation), 0) + 1 FROM game_server_generation)) "
+            "ON CONFLICT (id) DO UPDATE SET generation = excluded.generation RETURNING generation",
+            (game_server_id,)).fetchone()[0]
+
+    def get_generations(self, game_server_ids: list[int]) -> dict[int, int]:
+        result = dict.fromkeys(game_server_ids, 0)
+        if game_server_ids:
+            placeholders = ",".join("?" * len(game_server_ids))
+            result.update(self._connection.execute(
+                f"SELECT id, generation FROM game_server_generation WHERE id IN ({placeholders})",
+                game_server_ids).fetchall())
+        return result
+
+    def all_generations(self) -> dict[int, int]:
+        return dict(self._connection.execute("SELECT id, generation FROM game_server_generation").fetchall())
+
+    def restore(self, statuses: dict[int, models.GameServerStatus], generations: dict[int, int]) -> list[int]:
+        restored = []
+        with self._connection:
+            self._connection.execute("BEGIN")
+            for game_server_id, status in statuses.items():
+                row = self._connection.execute(self._UPSERT + "ON CONFLICT (id) DO NOTHING RETURNING id",
+                                               self._row(game_server_id, status)).fetchone()
+                if row is not None:
+                    restored.append(game_server_id)
+            self._connection.executemany(
+                "INSERT INTO game_server_generation (id, generation) VALUES (?, ?) ON CONFLICT (id) DO NOTHING",
+                generations.items())
+        return restored
+
+    def running_ids(self, now: Optional[datetime.datetime] = None) -> list[int]:
+        rows = self._connection.execute("SELECT id FROM game_server_status WHERE deadline > ? AND state != ?",
+                                        ((now or datetime.datetime.now()).timestamp(),
+                                         common.GameServerStateEnum.STOPPED.value)).fetchall()
+        return [row[0] for row in rows]
+
+    def next_deadline(self) -> Optional[datetime.datetime]:
+        row = self._connection.execute("SELECT MIN(deadline) FROM game_server_status").fetchone()
+        return datetime.datetime.fromtimestamp(row[0]) if row[0] is not None else None
+
+    def generations_since(self, generation: Optional[int]) -> tuple[int, dict[int, int]]:
+        if generation is None:
+            row = self._connection.execute("SELECT MAX(generation) FROM game_server_generation").fetchone()
+            return row[0] or 0, {}
+        changed = dict(self._connection.execute("SELECT id, generation FROM game_server_generation "
+                                                "WHERE generation > ?", (generation,)).fetchall())
+        return max(changed.values(), default=generation), changed
+
+    def set_admin(self, game_server_id: int, admin_id: Optional[str]) -> None:
+        with self._connection:
+            self._connection.execute("BEGIN")
+            self._connection.execute("INSERT INTO game_server_admin (id, admin_id) VALUES (?, ?) "
+                                     "ON CONFLICT (id) DO UPDATE SET admin_id = excluded.admin_id",
+                                     (game_server_id, admin_id))
+            self._connection.execute("UPDATE game_server_status SET admin_id = ? WHERE id = ? AND admin_id IS NOT ?",
+                                     (admin_id, game_server_id, admin_id))
+
+    def forget(self, game_server_id: int) -> None:
+        with self._connection:
+            self._connection.execute("BEGIN")
+            for table in ("game_server_status", "game_server_admin"):
+                self._connection.execute(f"DELETE FROM {table} WHERE id = ?", (game_server_id,))
+
+    def totals(self) -> tuple[dict[common.GameServerStateEnum, tuple[int, int]], dict[str, tuple[int, int]]]:
+        states = {}
+        admins = {}
+        for kind, key, server_count, player_count in self._connection.execute(
+                "SELECT kind, key, server_count, player_count FROM game_server_status_total WHERE server_count > 0"):
+            if kind == "state":
+                states[common.GameServerStateEnum(key)] = (server_count, player_count)
+            else:
+                admins[key] = (server_count, player_count)
+        return states, admins
+
+    def ranked_ids(self, start: int, stop: int) -> list[int]:
+        rows = self._connection.execute("SELECT id FROM game_server_status WHERE rank_group IS NOT NULL "
+                                        "ORDER BY rank_group, rank_value, id LIMIT ? OFFSET ?",
+                                        (stop - start, start)).fetchall()
+        return [row[0] for row in rows]
+
+
+def create_store(backend: str, path: Optional[pathlib.Path] = None) -> StatusStore:
+    """
+    Create the status store configured by ``[game_server] status_backend``.
+    :param backend: ``memory`` or ``sqlite``
+    :param path: database file of the ``sqlite`` backend
+    :return:
+    """
+    if backend == "memory":
+        return MemoryStatusStore()
+    if backend == "sqlite":
+        return SQLiteStatusStore(path)
+    raise ValueError(f"Unknown game server status backend: {backend}")
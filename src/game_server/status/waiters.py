@@ -0,0 +1,39 @@
+import asyncio
+
+
+class GenerationWaiters:
+    """
+    Long-poll requests parked until a server's generation changes. A waiter is one future resolved by
+    ``notify``, with no task of its own and nothing done while it waits.
+    """
+
+    def __init__(self):
+        self._waiters: dict[int, set[asyncio.Future]] = {}
+
+    def __len__(self) -> int:
+        return sum(len(waiters) for waiters in self._waiters.values())
+
+    async def wait(self, game_server_id: int, timeout: float) -> bool:
+        """
+        :param game_server_id:
+        :param timeout: seconds
+        :return: False on timeout
+        """
+        future = asyncio.get_running_loop().create_future()
+        waiters = self._waiters.setdefault(game_server_id, set())
+        waiters.add(future)
+        try:
+            await asyncio.wait_for(future, timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            waiters.discard(future)
+            if not waiters and self._waiters.get(game_server_id) is waiters:
+                del self._waiters[game_server_id]
+
+    def notify(self, game_server_id: int) -> None:
+        """Wake every waiter of a server."""
+        for future in self._waiters.pop(game_server_id, ()):
+            if not future.done():
+                future.set_result(None)
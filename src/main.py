@@ -1,11 +1,16 @@
+import asyncio
 import contextlib
 
 import fastapi.middleware.cors
+import fastapi.responses
 import fastapi.staticfiles
 
+import fastapi_users_with_username.exceptions
+
 import user
 import user_info
 import game_server
+import game_server.status.listener
 import universal.database, universal.config
 
 from scheduler import scheduler
@@ -14,8 +19,24 @@ from scheduler import scheduler
 @contextlib.asynccontextmanager
 async def lifespan(_: fastapi.FastAPI):
     await universal.database.create_db_and_tables()
+    game_server.status.crud.restore_snapshot()
     scheduler.start()
+    report_listener = game_server.status.listener.ReportListener(
+        universal.config.settings.GAME_SERVER_REPORT_HOST,
+        universal.config.settings.GAME_SERVER_REPORT_TCP_PORT,
+        universal.config.settings.GAME_SERVER_REPORT_UDP_PORT,
+    )
+    await report_listener.start()
+    broadcaster_task = asyncio.create_task(game_server.status.crud.broadcaster.run())
+    expiry_task = asyncio.create_task(game_server.status.crud.expiry_timer.run())
+    shared_feed_task = asyncio.create_task(game_server.status.crud.run_shared_feed())
     yield
+    shared_feed_task.cancel()
+    expiry_task.cancel()
+    broadcaster_task.cancel()
+    await report_listener.close()
+    scheduler.shutdown()
+    await game_server.status.crud.save_snapshot()
 
 
 app = fastapi.FastAPI(
@@ -32,6 +53,13 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+
+@app.exception_handler(fastapi_users_with_username.exceptions.PasswordHashingBusy)
+async def password_hashing_busy_handler(_: fastapi.Request, __: Exception) -> fastapi.responses.JSONResponse:
+    return fastapi.responses.JSONResponse(status_code=fastapi.status.HTTP_503_SERVICE_UNAVAILABLE,
+                                          content={"detail": "Server busy"}, headers={"Retry-After": "1"})
+
+
 app.mount("/static", fastapi.staticfiles.StaticFiles(directory=universal.config.settings.STATIC_DIR), name="static")
 
 
@@ -2,7 +2,10 @@ from apscheduler.schedulers.asyncio import AsyncIOScheduler
 
 
 import game_server.status.crud
+import universal.config
+import user.users
 
 scheduler = AsyncIOScheduler()
-scheduler.add_job(game_server.status.crud.cleanup_reported_data, "interval", seconds=600)
-
+scheduler.add_job(game_server.status.crud.save_snapshot, "interval",
+                  seconds=universal.config.settings.GAME_SERVER_STATUS_SNAPSHOT_INTERVAL)
+scheduler.add_job(user.users.delete_expired_tokens, "interval", seconds=600)
@@ -1,4 +1,4 @@
-from typing import Literal
+from typing import Literal, Optional
 import secrets
 import tomllib
 import os
@@ -6,7 +6,9 @@ import pathlib
 
 from pydantic_settings import BaseSettings
 
-SETTINGS_DIR = pathlib.Path(os.path.dirname(__file__)) / "../../settings.toml"
+SETTINGS_DIR = pathlib.Path(os.environ.get("RDFZ3D_SETTINGS",
+                                          pathlib.Path(os.path.dirname(__file__)) / "../../settings.toml"))
+"""可用环境变量 RDFZ3D_SETTINGS 指定其他配置文件，例如测试时使用 settings.template.toml"""
 with open(SETTINGS_DIR, "rb") as f:
     settings_dict = tomllib.load(f)
 
@@ -21,6 +23,35 @@ class Settings(BaseSettings):
                          f"/{settings_dict['database']['database']}")
     STATIC_DIR: pathlib.Path = SETTINGS_DIR.parent / "static"
 
+    GAME_SERVER_STATUS_BACKEND: Literal["memory", "sqlite"] = \
+        settings_dict.get("game_server", {}).get("status_backend", "memory")
+    GAME_SERVER_STATUS_PATH: pathlib.Path = pathlib.Path(
+        settings_dict.get("game_server", {}).get("status_path", "/dev/shm/rdfz3d_game_server_status.sqlite3"))
+    GAME_SERVER_STATUS_SNAPSHOT_PATH: Optional[pathlib.Path] = settings_dict.get("game_server", {}).get(
+        "status_snapshot_path", SETTINGS_DIR.parent / "game_server_status.json") or None
+    GAME_SERVER_STATUS_SNAPSHOT_INTERVAL: float = \
+        settings_dict.get("game_server", {}).get("status_snapshot_interval", 60.0)
+    GAME_SERVER_STATUS_EVENT_WINDOW: float = settings_dict.get("game_server", {}).get("status_event_window", 1.0)
+    GAME_SERVER_REPORT_HOST: str = settings_dict.get("game_server", {}).get("report_host", "0.0.0.0")
+    GAME_SERVER_REPORT_TCP_PORT: Optional[int] = settings_dict.get("game_server", {}).get("report_tcp_port")
+    GAME_SERVER_REPORT_UDP_PORT: Optional[int] = settings_dict.get("game_server", {}).get("report_udp_port")
+    GAME_SERVER_REPORT_TARGET_RATE: float = settings_dict.get("game_server", {}).get("report_target_rate", 1000.0)
+    GAME_SERVER_REPORT_LOOKUP_PER_SECOND: float = \
+        settings_dict.get("game_server", {}).get("report_lookup_per_second", 10.0)
+    GAME_SERVER_REPORT_LOOKUP_BURST: float = settings_dict.get("game_server", {}).get("report_lookup_burst", 100.0)
+
+    PASSWORD_HASH_WORKERS: int = settings_dict.get("auth", {}).get("password_hash_workers", os.cpu_count() or 1)
+    PASSWORD_HASH_MAX_PENDING: int = settings_dict.get("auth", {}).get("password_hash_max_pending", 64)
+    TOKEN_CACHE_TTL: float = settings_dict.get("auth", {}).get("token_cache_ttl", 30.0)
+
+    RATE_LIMIT_BACKEND: Literal["memory", "sqlite"] = settings_dict.get("rate_limit", {}).get("backend", "memory")
+    RATE_LIMIT_PATH: pathlib.Path = pathlib.Path(
+        settings_dict.get("rate_limit", {}).get("path", "/dev/shm/rdfz3d_rate_limit.sqlite3"))
+    RATE_LIMIT_LOGIN_PER_MINUTE: float = settings_dict.get("rate_limit", {}).get("login_per_minute", 10.0)
+    RATE_LIMIT_LOGIN_BURST: float = settings_dict.get("rate_limit", {}).get("login_burst", 10.0)
+    RATE_LIMIT_REGISTER_PER_HOUR: float = settings_dict.get("rate_limit", {}).get("register_per_hour", 60.0)
+    RATE_LIMIT_REGISTER_BURST: float = settings_dict.get("rate_limit", {}).get("register_burst", 60.0)
+
     ORIGIN_REGEX: str = r"^https?://((localhost|127\.0\.0\.1)(:\d+)?|(.*\.)?x-way\.work)$"
 
     class Config:
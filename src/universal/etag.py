@@ -0,0 +1,30 @@
+import hashlib
+from typing import Any, Optional
+
+
+def make_etag(*parts: Any, weak: bool = False) -> str:
+    """
+    Make an ETag from values that change whenever the representation changes,
+    e.g. row version counters and status generations.
+    :param parts:
+    :param weak: the representation also has values that change without ``parts`` changing, e.g. a clock extrapolated
+        on every read, so only semantic equivalence is promised
+    :return: quoted ETag, prefixed with ``W/`` if weak
+    """
+    digest = hashlib.blake2b(repr(parts).encode(), digest_size=12).hexdigest()
+    return f'W/"{digest}"' if weak else f'"{digest}"'
+
+
+def matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    Whether an ``If-None-Match`` header matches ``etag`` (weak comparison, as RFC 9110 requires for it).
+    :param if_none_match:
+    :param etag:
+    :return:
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == opaque for tag in if_none_match.split(","))
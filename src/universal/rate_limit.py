@@ -0,0 +1,158 @@
+"""
+令牌桶限流。每个键一个桶，容量 ``burst``，每秒补充 ``rate`` 个令牌，每个请求消耗一个。
+
+``MemoryBuckets`` 仅当前进程可见；``SQLiteBuckets`` 同一主机上所有 worker 共享，由 ``[rate_limit] backend`` 选择。
+"""
+import abc
+import collections
+import inspect
+import math
+import pathlib
+import sqlite3
+import time
+from typing import Awaitable, Callable, Optional, Union
+
+import fastapi
+
+import universal.config
+
+
+class Buckets(abc.ABC):
+    @abc.abstractmethod
+    def take(self, key: str, rate: float, burst: float, now: Optional[float] = None) -> float:
+        """
+        Take a token from the bucket of ``key``.
+        :param key:
+        :param rate: tokens per second
+        :param burst: capacity of the bucket
+        :param now: ``time.time()``
+        :return: 0 if a token was taken, otherwise seconds until one is available
+        """
+
+
+class MemoryBuckets(Buckets):
+    """
+    Buckets in this process, least recently used first. A bucket idle long enough to be full again is the same
+    as no bucket, so idle buckets are evicted from the front once they are full.
+
+    Buckets with different ``rate`` and ``burst`` are kept apart: in one LRU every bucket refills within
+    ``burst / rate`` seconds of its last use, so the front is always the first to be full again and a bucket is
+    kept at most ``burst / rate`` seconds after its last request. A slowly refilling bucket (registration) at the
+    front of a shared LRU would instead hold every bucket behind it.
+    """
+
+    def __init__(self):
+        # (rate, burst) -> key -> (tokens, updated, refilled_at)
+        self._groups: dict[tuple[float, float], collections.OrderedDict[str, tuple[float, float, float]]] = {}
+
+    def __len__(self) -> int:
+        return sum(len(buckets) for buckets in self._groups.values())
+
+    def take(self, key: str, rate: float, burst: float, now: Optional[float] = None) -> float:
+        now = now or time.time()
+        buckets = self._groups.setdefault((rate, burst), collections.OrderedDict())
+        while buckets:
+            oldest = next(iter(buckets.values()))
+            if oldest[2] > now:
+                break
+            buckets.popitem(last=False)
+        tokens, updated, _ = buckets.get(key, (burst, now, now))
+        tokens = min(burst, tokens + (now - updated) * rate)
+        retry_after = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            retry_after = (1 - tokens) / rate
+        buckets[key] = (tokens, now, now + (burst - tokens) / rate)
+        buckets.move_to_end(key)
+        return retry_after
+
+
+class SQLiteBuckets(Buckets):
+    """
+    Buckets in a SQLite database in WAL mode (see ``game_server.status.store.SQLiteStatusStore``),
+    shared by every worker on the host. Buckets that are full again are deleted every ``CLEANUP_EVERY`` takes.
+    """
+    CLEANUP_EVERY = 1024
+
+    def __init__(self, path: pathlib.Path):
+        self.path = path
+        self._connection = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=OFF")
+        self._connection.execute("PRAGMA busy_timeout=1000")
+        self._connection.execute("CREATE TABLE IF NOT EXISTS rate_limit_bucket ("
+                                 "key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL, "
+                                 "refilled_at REAL NOT NULL)")
+        self._connection.execute("CREATE INDEX IF NOT EXISTS ix_rate_limit_bucket_refilled_at "
+                                 "ON rate_limit_bucket (refilled_at)")
+        self._takes = 0
+
+    def take(self, key: str, rate: float, burst: float, now: Optional[float] = None) -> float:
+        now = now or time.time()
+        with self._connection:
+            self._connection.execute("BEGIN IMMEDIATE")
+            row = self._connection.execute("SELECT tokens, updated FROM rate_limit_bucket WHERE key = ?",
+                                           (key,)).fetchone()
+            tokens, updated = row if row else (burst, now)
+            tokens = min(burst, tokens + (now - updated) * rate)
+            retry_after = 0.0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                retry_after = (1 - tokens) / rate
+            self._connection.execute("INSERT OR REPLACE INTO rate_limit_bucket (key, tokens, updated, refilled_at) "
+                                     "VALUES (?, ?, ?, ?)", (key, tokens, now, now + (burst - tokens) / rate))
+            self._takes += 1
+            if self._takes % self.CLEANUP_EVERY == 0:
+                self._connection.execute("DELETE FROM rate_limit_bucket WHERE refilled_at <= ?", (now,))
+        return retry_after
+
+
+def create_buckets(backend: str, path: Optional[pathlib.Path] = None) -> Buckets:
+    """
+    :param backend: ``memory`` or ``sqlite``
+    :param path: database file of the ``sqlite`` backend
+    :return:
+    """
+    if backend == "memory":
+        return MemoryBuckets()
+    if backend == "sqlite":
+        return SQLiteBuckets(path)
+    raise ValueError(f"Unknown rate limit backend: {backend}")
+
+
+buckets = create_buckets(universal.config.settings.RATE_LIMIT_BACKEND, universal.config.settings.RATE_LIMIT_PATH)
+
+
+def client_host(request: fastapi.Request) -> str:
+    return request.client.host
+
+
+class RateLimit:
+    """
+    A dependency answering 429 with ``Retry-After`` when the bucket of the request is empty.
+    """
+
+    def __init__(self, name: str, rate: float, burst: float,
+                 key: Callable[[fastapi.Request], Union[str, Awaitable[str]]] = client_host):
+        """
+        :param name: prefix of the keys, so that routes do not share buckets
+        :param rate: requests per second
+        :param burst: requests allowed at once
+        :param key: builds the key of a request, the client IP by default. May be async, e.g. to read the body
+        """
+        self.name = name
+        self.rate = rate
+        self.burst = burst
+        self.key = key
+
+    async def __call__(self, request: fastapi.Request) -> None:
+        key = self.key(request)
+        if inspect.isawaitable(key):
+            key = await key
+        retry_after = buckets.take(f"{self.name}:{key}", self.rate, self.burst)
+        if retry_after:
+            raise fastapi.HTTPException(status_code=fastapi.status.HTTP_429_TOO_MANY_REQUESTS,
+                                        detail="Too many requests",
+                                        headers={"Retry-After": str(math.ceil(retry_after))})
@@ -1,23 +1,63 @@
-from typing import Optional, Generator
+from typing import Any, Optional, Generator
 
 import fastapi
+import fastapi_users.exceptions
+import sqlalchemy
 from sqlmodel.ext.asyncio.session import AsyncSession
 import fastapi_users_db_sqlmodel.access_token
 
 from universal import database
 import fastapi_users_with_username
+from .token_cache import token_cache
 
 
 class User(fastapi_users_with_username.db.SQLModelBaseUserDB, table=True):
     pass
 
 
+# 登录时按 lower(username) / lower(email) 查找，普通索引用不上（MySQL 8.0.13+ 支持函数索引）
+sqlalchemy.Index("ix_user_username_lower", sqlalchemy.func.lower(User.username))
+sqlalchemy.Index("ix_user_email_lower", sqlalchemy.func.lower(User.email))
+
+
 class AccessToken(fastapi_users_with_username.db.SQLModelBaseAccessToken, table=True):
     client_type: Optional[str]
 
 
+# UserManager.token_uniqueness_statement 按 user_id 和 client_type 删除；created_at 已有索引，供 delete_expired_tokens 使用
+sqlalchemy.Index("ix_accesstoken_user_id_client_type", AccessToken.user_id, AccessToken.client_type)
+
+
+class UserDatabase(fastapi_users_with_username.db.SQLModelUserDatabaseAsync):
+    """
+    Drops the cached tokens of a user (see ``token_cache``) whenever it is changed or deleted.
+    Users built from the cache are detached snapshots; they are swapped for the instance of this session before
+    any write, so that they do not clash with one already loaded (e.g. by ``authenticate``), nor write stale columns.
+    """
+
+    async def _attached(self, user: User) -> User:
+        if not sqlalchemy.inspect(user).detached:
+            return user
+        attached = await self.session.get(User, user.id)
+        if attached is None:
+            raise fastapi_users.exceptions.UserNotExists()
+        return attached
+
+    async def update(self, user: User, update_dict: dict[str, Any]) -> User:
+        try:
+            return await super().update(await self._attached(user), update_dict)
+        finally:
+            token_cache.invalidate_user(str(user.id))
+
+    async def delete(self, user: User) -> None:
+        try:
+            await super().delete(await self._attached(user))
+        finally:
+            token_cache.invalidate_user(str(user.id))
+
+
 async def get_user_db(session: AsyncSession = fastapi.Depends(database.get_async_session)):
-    yield fastapi_users_with_username.db.SQLModelUserDatabaseAsync(session, User)
+    yield UserDatabase(session, User)
 
 
 async def get_access_token_db(session: AsyncSession = fastapi.Depends(database.get_async_session)):
@@ -2,11 +2,33 @@ from fastapi import APIRouter
 import fastapi
 import fastapi_users_with_username
 import fastapi_users_with_username.router
+import universal.config
+import universal.rate_limit
 
 from . import schemas, users, utils
 
 router = APIRouter()
 
+
+async def login_key(request: fastapi.Request) -> str:
+    """
+    Key login buckets on the login name and the client IP: a whole class behind one school NAT logs in at once.
+    """
+    try:
+        body = await request.json()
+        identifier = str(body.get("username", "")).lower()
+    except (ValueError, AttributeError):
+        identifier = ""
+    return f"{identifier}:{universal.rate_limit.client_host(request)}"
+
+
+login_rate_limit = universal.rate_limit.RateLimit(
+    "login", universal.config.settings.RATE_LIMIT_LOGIN_PER_MINUTE / 60,
+    universal.config.settings.RATE_LIMIT_LOGIN_BURST, login_key)
+register_rate_limit = universal.rate_limit.RateLimit(
+    "register", universal.config.settings.RATE_LIMIT_REGISTER_PER_HOUR / 3600,
+    universal.config.settings.RATE_LIMIT_REGISTER_BURST)
+
 _AUTH_LOGIN_ROUTER_DESCRIPTION = """
 <b>关于 unique 和 client_type 参数：</b>
 <ul>
@@ -17,13 +39,15 @@ unique 与 client_type 没有关联（unique 不是 client_type 的属性）
 """
 router.include_router(
     users.fastapi_users_obj.get_custom_auth_router(users.auth_backend, schemas.UserLogin,
-                                                   login_description=_AUTH_LOGIN_ROUTER_DESCRIPTION),
+                                                   login_description=_AUTH_LOGIN_ROUTER_DESCRIPTION,
+                                                   login_dependencies=[fastapi.Depends(login_rate_limit)]),
     prefix="",
 )
 router.include_router(
     users.fastapi_users_obj.get_register_router(schemas.UserRead, schemas.UserCreate),
     prefix="",
     deprecated=True,
+    dependencies=[fastapi.Depends(register_rate_limit)],
 )
 router.include_router(
     users.fastapi_users_obj.get_verify_router(schemas.UserRead),
@@ -0,0 +1,78 @@
+import collections
+import time
+from typing import Any, Optional
+
+import universal.config
+
+TOKEN_CACHE_SIZE = 65536
+TOKEN_CACHE_TTL = universal.config.settings.TOKEN_CACHE_TTL
+"""
+注销、修改用户只会立即清除处理该请求的 worker 的缓存；其他 worker 的缓存最多在这么多秒后过期，在此之前旧 token、
+被禁用的用户仍可使用。见 ``[auth] token_cache_ttl``
+"""
+
+
+class TokenCache:
+    """
+    Access token -> snapshot of its user, least recently used first. Entries live ``ttl`` seconds at most,
+    and never past the expiry of the token.
+    """
+
+    def __init__(self, size: int = TOKEN_CACHE_SIZE, ttl: float = TOKEN_CACHE_TTL):
+        self.size = size
+        self.ttl = ttl
+        # token -> (user_id, user snapshot, expires_at)
+        self._entries: collections.OrderedDict[str, tuple[str, dict[str, Any], float]] = collections.OrderedDict()
+        self._tokens_by_user: dict[str, set[str]] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, token: str) -> Optional[dict[str, Any]]:
+        """
+        :param token:
+        :return: the user snapshot, or None on a cache miss
+        """
+        entry = self._entries.get(token)
+        if entry is None:
+            return None
+        if entry[2] <= time.monotonic():
+            self.invalidate_token(token)
+            return None
+        self._entries.move_to_end(token)
+        return entry[1]
+
+    def put(self, token: str, user_id: str, user: dict[str, Any], token_expires_in: Optional[float] = None) -> None:
+        """
+        :param token:
+        :param user_id:
+        :param user: snapshot of the user's columns
+        :param token_expires_in: seconds until the token itself expires, None if it does not
+        :return:
+        """
+        ttl = self.ttl if token_expires_in is None else min(self.ttl, token_expires_in)
+        if ttl <= 0:
+            return
+        self.invalidate_token(token)
+        self._entries[token] = (user_id, user, time.monotonic() + ttl)
+        self._tokens_by_user.setdefault(user_id, set()).add(token)
+        while len(self._entries) > self.size:
+            self.invalidate_token(next(iter(self._entries)))
+
+    def invalidate_token(self, token: str) -> None:
+        entry = self._entries.pop(token, None)
+        if entry is None:
+            return
+        tokens = self._tokens_by_user.get(entry[0])
+        if tokens is not None:
+            tokens.discard(token)
+            if not tokens:
+                del self._tokens_by_user[entry[0]]
+
+    def invalidate_user(self, user_id: str) -> None:
+        """Drop every cached token of a user, e.g. after it changed or some of its tokens were deleted."""
+        for token in self._tokens_by_user.pop(user_id, ()):
+            self._entries.pop(token, None)
+
+
+token_cache = TokenCache()
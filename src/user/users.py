@@ -1,32 +1,45 @@
 from typing import Optional, AsyncGenerator
+import datetime
+import logging
 import re
 
+import sqlalchemy.orm
 import sqlmodel
-from fastapi import Depends, Request, Response
+from fastapi import Depends, Request
 import fastapi_users
 import fastapi_users.authentication
-from fastapi_users import models
 from sqlmodel.ext.asyncio.session import AsyncSession
 
 import fastapi_users_with_username
 import fastapi_users_with_username.exceptions
+import fastapi_users_with_username.hashing
 import fastapi_users_with_username.schemas
 
 import universal.config
 import universal.database
 from . import db
 from . import schemas
+from .token_cache import token_cache
+
+logger = logging.getLogger(__name__)
 
 SECRET = universal.config.settings.SECRET_KEY
+TOKEN_LIFETIME_SECONDS = 60 * 60 * 24
+EXPIRED_TOKEN_BATCH_SIZE = 1000
 
 
 class UserManager(fastapi_users_with_username.ULIDIDMixin,
                   fastapi_users_with_username.BaseUserManager[db.User, schemas.ID_TYPE]):
     reset_password_token_secret = SECRET
     verification_token_secret = SECRET
+    password_hash_pool = fastapi_users_with_username.hashing.PasswordHashPool(
+        universal.config.settings.PASSWORD_HASH_WORKERS, universal.config.settings.PASSWORD_HASH_MAX_PENDING)
 
     async def get_safe(self, user_id: schemas.ID_TYPE) -> schemas.UserReadSafe:
-        user = await self.get(user_id)
+        return self.to_safe(await self.get(user_id))
+
+    @staticmethod
+    def to_safe(user: db.User) -> schemas.UserReadSafe:
         if not user.is_active:
             raise fastapi_users.exceptions.UserInactive()
         result = schemas.UserReadSafe.model_validate(user, from_attributes=True)
@@ -49,39 +62,27 @@ class UserManager(fastapi_users_with_username.ULIDIDMixin,
     ):
         print(f"Verification requested for user {user.id}. Verification token: {token}")
 
-    async def on_after_login(self, user: models.UP, request: Optional[Request] = None,
-                             response: Optional[Response] = None, ) -> None:
-        # noinspection PyProtectedMember
-        login_info = schemas.UserLogin.model_validate(request._json)
-        token_info = fastapi_users.authentication.transport.bearer.BearerResponse.model_validate_json(response.body)
-        async for db_session in universal.database.get_async_session():
-            # noinspection PyTypeChecker
-            token_obj = await db_session.exec(
-                sqlmodel.select(db.AccessToken).where(db.AccessToken.token == token_info.access_token))
-            token_obj = token_obj.one()
-            token_obj.client_type = login_info.client_type
-            await db_session.commit()
-            if login_info.unique:
-                await self.check_token_uniqueness(db_session, token_info.access_token, user.id, login_info.client_type)
+    async def write_login_token(self, strategy: fastapi_users.authentication.Strategy, user: db.User,
+                                credentials: schemas.UserLogin) -> str:
+        return await strategy.write_token(user, credentials.client_type, credentials.unique)
 
     @staticmethod
-    async def check_token_uniqueness(db_session: AsyncSession, token: str, user_id: str, client_type: Optional[str]):
+    def token_uniqueness_statement(token: str, user_id: str, client_type: Optional[str]):
+        """
+        Delete the other tokens of a user with the same ``client_type``, or all of them if ``client_type`` is None.
+        """
         if client_type is None:
             # noinspection PyTypeChecker
-            statement = sqlmodel.delete(db.AccessToken).where(
-                (db.AccessToken.user_id == user_id)
-                & (db.AccessToken.token != token)
-            )
-        else:
-            # noinspection PyTypeChecker
-            statement = sqlmodel.delete(db.AccessToken).where(
+            return sqlmodel.delete(db.AccessToken).where(
                 (db.AccessToken.user_id == user_id)
-                & (db.AccessToken.client_type == client_type)
                 & (db.AccessToken.token != token)
             )
-        # 删除已有
-        await db_session.exec(statement)
-        await db_session.commit()
+        # noinspection PyTypeChecker
+        return sqlmodel.delete(db.AccessToken).where(
+            (db.AccessToken.user_id == user_id)
+            & (db.AccessToken.client_type == client_type)
+            & (db.AccessToken.token != token)
+        )
 
     async def validate_username(self, username: str, _) -> None:
         if not re.match(r"^[a-zA-Z0-9_]+$", username):
@@ -111,10 +112,92 @@ async def get_user_manager(user_db: fastapi_users_with_username.db.SQLModelUserD
 bearer_transport = fastapi_users.authentication.BearerTransport(tokenUrl="auth/login")
 
 
+class CachedDatabaseStrategy(fastapi_users.authentication.strategy.db.DatabaseStrategy):
+    """
+    ``DatabaseStrategy`` that remembers the user of a token in ``token_cache``, so that authenticated requests
+    usually need no query. Logging out, a unique login (``write_token``) and any change to the user
+    (``db.UserDatabase``) invalidate the cache.
+    """
+
+    async def read_token(self, token: Optional[str],
+                         user_manager: fastapi_users.BaseUserManager[db.User, schemas.ID_TYPE]) -> Optional[db.User]:
+        if token is None:
+            return None
+        snapshot = token_cache.get(token)
+        if snapshot is not None:
+            user = db.User(**snapshot)
+            # 作为已持久化的对象，之后可以直接加入其他 session 中修改
+            sqlalchemy.orm.make_transient_to_detached(user)
+            return user
+        now = datetime.datetime.now(datetime.timezone.utc)
+        max_age = now - datetime.timedelta(seconds=self.lifetime_seconds) if self.lifetime_seconds else None
+        access_token = await self.database.get_by_token(token, max_age)
+        if access_token is None:
+            return None
+        try:
+            user = await user_manager.get(user_manager.parse_id(access_token.user_id))
+        except (fastapi_users.exceptions.UserNotExists, fastapi_users.exceptions.InvalidID):
+            return None
+        token_expires_in = None
+        if self.lifetime_seconds:
+            created_at = access_token.created_at
+            if created_at.tzinfo is None:
+                created_at = created_at.replace(tzinfo=datetime.timezone.utc)
+            token_expires_in = (created_at - max_age).total_seconds()
+        token_cache.put(token, str(user.id), user.model_dump(), token_expires_in)
+        return user
+
+    async def write_token(self, user: db.User, client_type: Optional[str] = None, unique: bool = False) -> str:
+        """
+        Insert a token with its ``client_type`` and, if ``unique``, delete the other tokens of the user
+        (see ``UserManager.token_uniqueness_statement``), in one transaction.
+        """
+        access_token_dict = self._create_access_token_dict(user)
+        session = self.database.session
+        session.add(db.AccessToken(**access_token_dict, client_type=client_type))
+        if unique:
+            await session.exec(UserManager.token_uniqueness_statement(access_token_dict["token"], user.id, client_type))
+        await session.commit()
+        if unique:
+            token_cache.invalidate_user(str(user.id))
+        return access_token_dict["token"]
+
+    async def destroy_token(self, token: str, user: db.User) -> None:
+        token_cache.invalidate_token(token)
+        await super().destroy_token(token, user)
+
+
 def get_database_strategy(access_token_db: fastapi_users.authentication.strategy.db.AccessTokenDatabase[db.AccessToken]
                           = Depends(db.get_access_token_db)) \
         -> fastapi_users.authentication.strategy.db.DatabaseStrategy:
-    return fastapi_users.authentication.strategy.db.DatabaseStrategy(access_token_db, lifetime_seconds=60 * 60 * 24)
+    return CachedDatabaseStrategy(access_token_db, lifetime_seconds=TOKEN_LIFETIME_SECONDS)
+
+
+async def delete_expired_tokens(batch_size: int = EXPIRED_TOKEN_BATCH_SIZE) -> int:
+    """
+    Delete the access tokens older than ``TOKEN_LIFETIME_SECONDS``, ``batch_size`` rows per transaction,
+    so that no single delete holds locks for long. Run periodically by ``scheduler``.
+    :param batch_size:
+    :return: number of deleted tokens
+    """
+    expired_before = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(seconds=TOKEN_LIFETIME_SECONDS)
+    deleted = 0
+    async with AsyncSession(universal.database.engine) as db_session:
+        while True:
+            # noinspection PyTypeChecker
+            tokens = (await db_session.exec(
+                sqlmodel.select(db.AccessToken.token).where(db.AccessToken.created_at < expired_before)
+                .order_by(db.AccessToken.created_at).limit(batch_size))).all()
+            if not tokens:
+                break
+            # noinspection PyTypeChecker
+            result = await db_session.exec(sqlmodel.delete(db.AccessToken).where(db.AccessToken.token.in_(tokens)))
+            await db_session.commit()
+            deleted += result.rowcount
+            if len(tokens) < batch_size:
+                break
+    logger.info("Deleted %d expired access tokens", deleted)
+    return deleted
 
 
 auth_backend = fastapi_users.authentication.AuthenticationBackend(
@@ -12,6 +12,7 @@ import fastapi_users.exceptions
 import fastapi_users_with_username.models
 import user.schemas
 import user.users
+import universal.etag
 from . import schemas, models
 from . import avatar
 
@@ -31,6 +32,7 @@ async def get_user_info(db_session: AsyncSession, user_id: str, raise_on_not_fou
         user_info = user_info.one()
         if not user_info.avatar_path or not user_info.avatar_path.startswith("/static/avatar/"):
             user_info.avatar_path = "/static/avatar/default_avatar.png"
+            user_info.version += 1
             await db_session.commit()
         return user_info
     except sqlalchemy.exc.NoResultFound:
@@ -67,8 +69,27 @@ async def create_user(db_session: AsyncSession,
 async def read_user(db_session: AsyncSession,
                     user_manager: user.users.UserManager,
                     user_id: str, ) -> schemas.UserFullRead:
-    user_auth = await user_manager.get_safe(user_manager.parse_id(user_id))
+    return (await read_user_with_etag(db_session, user_manager, user_id))[1]
+
+
+async def read_user_with_etag(db_session: AsyncSession,
+                              user_manager: user.users.UserManager,
+                              user_id: str,
+                              if_none_match: Optional[str] = None) -> tuple[str, Optional[schemas.UserFullRead]]:
+    """
+    Read a user, with an ETag made of the version counters of its user and user_info rows.
+    :param db_session:
+    :param user_manager:
+    :param user_id:
+    :param if_none_match: the request's ``If-None-Match``
+    :return: (ETag, user), user being None if the ETag matches ``if_none_match``
+    """
+    user_db = await user_manager.get(user_manager.parse_id(user_id))
+    user_auth = user_manager.to_safe(user_db)
     user_info = await get_user_info(db_session, user_id)
+    etag = universal.etag.make_etag(user_id, user_db.version, user_info.version)
+    if universal.etag.matches(if_none_match, etag):
+        return etag, None
     user_info_visibility = models.UserInfoVisibility.model_validate(user_info)
     user_info_visibility_dumped = user_info_visibility.model_dump()
     result = schemas.UserFullRead.model_validate(user_auth.model_dump() | user_info.model_dump())
@@ -77,7 +98,7 @@ async def read_user(db_session: AsyncSession,
             continue
         field = key[:-7]  # Remove "_public"
         setattr(result, field, None)  # Also works with bool
-    return result
+    return etag, result
 
 
 async def read_user_by_username(db_session: AsyncSession,
@@ -136,6 +157,7 @@ async def update_user(db_session: AsyncSession,
             setattr(user_info, key, value)
         except ValueError:
             continue
+    user_info.version += 1
     await db_session.commit()
     return schemas.UserFullReadAdmin.model_validate(updated_user_auth.model_dump() | user_info.model_dump())
 
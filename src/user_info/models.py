@@ -33,4 +33,6 @@ class UserInfoVisibility(sqlmodel.SQLModel):
 
 class UserInfo(UserInfoVisibility, UserInfoBase, UserInfoId, table=True):
     __tablename__ = "user_info"
+    version: int = sqlmodel.Field(default=0, nullable=False, sa_column_kwargs={"server_default": "0"})
+    """每次修改加一，用于 ETag"""
 
@@ -1,3 +1,5 @@
+from typing import Optional
+
 import PIL
 import fastapi
 from fastapi import APIRouter
@@ -13,6 +15,7 @@ import fastapi_users_with_username.router.common
 import user.users
 import user.utils
 import universal.database
+from user.router import register_rate_limit
 from . import schemas, crud
 
 router = APIRouter()
@@ -61,8 +64,10 @@ HTTP_400_DOC = {
     "/register",
     status_code=fastapi.status.HTTP_201_CREATED,
     responses={
-        fastapi.status.HTTP_400_BAD_REQUEST: HTTP_400_DOC
+        fastapi.status.HTTP_400_BAD_REQUEST: HTTP_400_DOC,
+        fastapi.status.HTTP_429_TOO_MANY_REQUESTS: {"description": "Too many requests"},
     },
+    dependencies=[fastapi.Depends(register_rate_limit)],
 )
 async def create_user(user_full: schemas.UserFullCreate,
                       request: fastapi.Request,
@@ -189,16 +194,23 @@ async def upload_avatar(
 @router.get(
     "/{user_id}",
     responses={
+        fastapi.status.HTTP_304_NOT_MODIFIED: {"description": "Not modified"},
         fastapi.status.HTTP_404_NOT_FOUND: {"description": "User not found"},
         fastapi.status.HTTP_401_UNAUTHORIZED: {"description": "Inactive user"},
     },
 )
 async def read_user(user_id: str,
+                    response: fastapi.Response,
+                    if_none_match: Optional[str] = fastapi.Header(default=None),
                     user_manager: user.users.UserManager = fastapi.Depends(user.users.get_user_manager),
                     db_session: AsyncSession = fastapi.Depends(universal.database.get_async_session),
                     ) -> schemas.UserFullRead:
     try:
-        return await crud.read_user(db_session, user_manager, user_id)
+        etag, user_full = await crud.read_user_with_etag(db_session, user_manager, user_id, if_none_match)
+        if user_full is None:
+            return fastapi.Response(status_code=fastapi.status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+        response.headers["ETag"] = etag
+        return user_full
     except fastapi_users.exceptions.UserNotExists:
         raise fastapi.HTTPException(
             status_code=fastapi.status.HTTP_404_NOT_FOUND,
@@ -0,0 +1,34 @@
+"""
+测试使用 settings.template.toml 和临时目录下的 SQLite 数据库，不需要 MySQL。
+
+    pip install -r requirements.txt -r requirements-dev.txt
+    python -m pytest
+"""
+import os
+import pathlib
+import sqlite3
+import sys
+import tempfile
+
+import pytest
+import ulid
+
+ROOT = pathlib.Path(__file__).parent.parent
+TEMP_DIR = pathlib.Path(tempfile.mkdtemp(prefix="rdfz3d-test-"))
+
+# 必须在导入任何项目模块之前设置
+os.environ.setdefault("RDFZ3D_SETTINGS", str(ROOT / "settings.template.toml"))
+os.environ.setdefault("DATABASE_URI", f"sqlite+aiosqlite:///{TEMP_DIR / 'test.sqlite3'}")
+os.environ.setdefault("GAME_SERVER_STATUS_SNAPSHOT_PATH", str(TEMP_DIR / "game_server_status.json"))
+sys.path.insert(0, str(ROOT / "src"))
+# user.id 的默认值是 ULID 对象，asyncmy 会将其转为字符串，sqlite3 需要显式注册
+sqlite3.register_adapter(ulid.ULID, str)
+
+
+@pytest.fixture(scope="session")
+def client():
+    import fastapi.testclient
+    import main
+
+    with fastapi.testclient.TestClient(main.app) as test_client:
+        yield test_client
@@ -0,0 +1,61 @@
+import importlib
+import math
+
+import pytest
+
+from game_server import crud as game_server_crud
+from game_server.status import common, crud
+
+# game_server.status 包的 router 属性是 APIRouter，不是模块
+status_router = importlib.import_module("game_server.status.router")
+
+HEADERS = {"User-Agent": "Rdfz3D HTTP Client/1.0"}
+# TestClient 的客户端地址
+HOST = "testclient"
+
+
+@pytest.fixture
+def reporters(monkeypatch):
+    """
+    Game servers 9001 (reporting from the test client) and 9002 (from elsewhere), and no 9003,
+    without touching the DB.
+    """
+    monkeypatch.setitem(game_server_crud.reporter_host_cache, 9001, (True, HOST, math.inf))
+    monkeypatch.setitem(game_server_crud.reporter_host_cache, 9002, (True, "10.0.0.1", math.inf))
+    monkeypatch.setitem(game_server_crud.reporter_host_cache, 9003, (False, None, math.inf))
+
+
+def test_results_per_entry(client, reporters):
+    response = client.post("/game_server/report", headers=HEADERS, json={
+        "9001": {"state": "running", "player_count": 7, "max_player_count": 20},
+        "9002": {"state": "running", "player_count": 1},
+        "9003": {"state": "running", "player_count": 1},
+        "9004": {"state": "running", "player_count": -1},
+    })
+    assert response.status_code == 200
+    results = response.json()
+    assert results["9001"]["status_code"] == 200
+    assert results["9001"]["interval"] > 0 and results["9001"]["expires_at"]
+    assert results["9002"]["status_code"] == 403
+    assert results["9003"]["status_code"] == 404
+    assert results["9004"]["status_code"] == 422
+    assert "player_count" in results["9004"]["detail"]
+    stored = crud.get_server_status(9001)
+    assert stored.state == common.GameServerStateEnum.RUNNING and stored.player_count == 7
+    assert crud.get_server_status(9002).state == common.GameServerStateEnum.STOPPED
+
+
+def test_batch_size_is_capped(client, reporters):
+    body = {str(game_server_id): {"state": "running"}
+            for game_server_id in range(status_router.MAX_BATCH_REPORTS + 1)}
+    assert client.post("/game_server/report", headers=HEADERS, json=body).status_code == 422
+
+
+def test_keys_must_be_ids(client, reporters):
+    assert client.post("/game_server/report", headers=HEADERS,
+                       json={"abc": {"state": "running"}}).status_code == 422
+
+
+def test_user_agent_is_checked(client, reporters):
+    response = client.post("/game_server/report", json={"9001": {"state": "running"}})
+    assert response.status_code == 401
@@ -0,0 +1,89 @@
+import asyncio
+import datetime
+import json
+
+import pytest
+
+from game_server.status import crud, common, events, models, schemas, store
+
+
+def _status(**kwargs) -> models.GameServerStatus:
+    return models.GameServerStatus(state=common.GameServerStateEnum.RUNNING, player_count=1, max_player_count=10,
+                                   last_updated=datetime.datetime.now(), **kwargs)
+
+
+def _servers(message: events.Message) -> dict:
+    return json.loads(message.text)["servers"]
+
+
+def test_snapshot_is_cached_until_publish():
+    broadcaster = events.StatusBroadcaster()
+    calls = []
+
+    def snapshot():
+        calls.append(None)
+        return {1: {"player_count": len(calls)}}
+
+    _, first = broadcaster.subscribe(snapshot)
+    _, second = broadcaster.subscribe(snapshot)
+    assert len(calls) == 1 and first.text == second.text
+    broadcaster.publish(1, {"player_count": 2})
+    _, third = broadcaster.subscribe(snapshot)
+    assert _servers(third) == {"1": {"player_count": 2}}
+
+
+def test_snapshot_functions_run_for_every_subscriber():
+    broadcaster = events.StatusBroadcaster()
+    ticks = iter(range(100))
+    broadcaster.subscribe(lambda: {1: {"fixed": True}, 2: lambda: {"tick": next(ticks)}})
+    _, message = broadcaster.subscribe(lambda: pytest.fail("snapshot should be cached"))
+    assert _servers(message) == {"1": {"fixed": True}, "2": {"tick": 1}}
+    assert message.sse == f"event: snapshot\ndata: {message.text}\n\n"
+
+
+@pytest.fixture
+def shared(tmp_path, monkeypatch):
+    """
+    This worker on a shared store, and another worker's view of the same store.
+    """
+    path = tmp_path / "status.sqlite3"
+    monkeypatch.setattr(crud, "status_store", store.SQLiteStatusStore(path))
+    monkeypatch.setattr(crud, "broadcaster", events.StatusBroadcaster())
+    monkeypatch.setattr(crud, "_followed_generation", None)
+    monkeypatch.setattr(crud, "_own_generations", set())
+    crud.follow_shared_store()
+    return store.SQLiteStatusStore(path)
+
+
+def test_follow_shared_store_publishes_other_workers_changes(shared):
+    shared.put(1, _status(detail="a"))
+    shared.bump_generation(1)
+    crud.follow_shared_store()
+    assert crud.broadcaster._pending[1]["detail"] == "a"
+    crud.broadcaster.flush()
+
+    shared.remove(1)
+    shared.bump_generation(1)
+    crud.follow_shared_store()
+    assert crud.broadcaster._pending[1]["state"] == common.GameServerStateEnum.STOPPED
+
+
+def test_follow_shared_store_skips_own_changes(shared):
+    crud.report_server_status(1, schemas.GameServerReport(state=common.GameServerStateEnum.RUNNING, player_count=1))
+    crud.broadcaster.flush()
+    crud.follow_shared_store()
+    assert crud.broadcaster._pending == {}
+
+
+def test_follow_shared_store_wakes_waiters(shared):
+    async def wait_for_change():
+        waiting = asyncio.create_task(crud.wait_server_status(1, 0, 5))
+        await asyncio.sleep(0)
+        shared.put(1, _status())
+        shared.bump_generation(1)
+        crud.follow_shared_store()
+        return await asyncio.wait_for(waiting, 1)
+
+    result = asyncio.run(wait_for_change())
+    assert result.generation > 0
+    assert result.status.state == common.GameServerStateEnum.RUNNING
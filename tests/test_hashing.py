@@ -0,0 +1,56 @@
+import asyncio
+import threading
+
+import pytest
+
+from fastapi_users_with_username import exceptions, hashing
+
+
+def test_slot_held_until_cancelled_hash_finishes():
+    pool = hashing.PasswordHashPool(1, 1)
+    started = threading.Event()
+    release = threading.Event()
+
+    def slow_hash():
+        started.set()
+        release.wait(5)
+        return "hash"
+
+    async def scenario():
+        task = asyncio.create_task(pool.run(slow_hash))
+        await asyncio.to_thread(started.wait, 5)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        # 请求已取消，但哈希仍在计算，不能再接受新的
+        assert pool.pending == 1
+        with pytest.raises(exceptions.PasswordHashingBusy):
+            await pool.run(str)
+        release.set()
+        for _ in range(100):
+            if not pool.pending:
+                break
+            await asyncio.sleep(0.01)
+        assert pool.pending == 0
+        assert await pool.run(str, 1) == "1"
+
+    asyncio.run(scenario())
+
+
+def test_queued_hash_cancelled_with_its_request():
+    pool = hashing.PasswordHashPool(1, 2)
+    release = threading.Event()
+
+    async def scenario():
+        running = asyncio.create_task(pool.run(release.wait, 5))
+        queued = asyncio.create_task(pool.run(str, 1))
+        await asyncio.sleep(0.05)
+        queued.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await queued
+        assert pool.pending == 1
+        release.set()
+        await running
+        assert pool.pending == 0
+
+    asyncio.run(scenario())
@@ -0,0 +1,77 @@
+import datetime
+import heapq
+import random
+
+import pydantic
+import pytest
+
+from game_server.status import common, crud, heartbeat, models, schemas, store
+
+
+def _simulate(servers: int, target_rate: float, seconds: float, step: float = 0.1) -> list[float]:
+    """
+    Servers report at the interval they were handed out at their last report, like real game servers.
+    :return: the interval after every step
+    """
+    random.seed(0)
+    planner = heartbeat.HeartbeatPlanner(target_rate, lambda: servers)
+    planner._window_start = 0.0
+    # 所有服务器同时启动
+    due = [(0.0, server) for server in range(servers)]
+    heapq.heapify(due)
+    intervals = []
+    now = 0.0
+    while now < seconds:
+        now += step
+        count = 0
+        while due and due[0][0] <= now:
+            _, server = heapq.heappop(due)
+            count += 1
+            heapq.heappush(due, (now + planner.next_interval(), server))
+        planner.record(count, now=now)
+        intervals.append(planner.interval)
+    return intervals
+
+
+def test_interval_converges_without_oscillating():
+    intervals = _simulate(10000, 1000, 120)
+    settled = intervals[len(intervals) // 2:]
+    assert all(abs(interval - 10) < 0.01 for interval in settled)
+    assert max(intervals) <= 10.01
+
+
+def test_few_servers_report_at_min_interval():
+    intervals = _simulate(100, 1000, 30)
+    assert all(interval == heartbeat.MIN_INTERVAL for interval in intervals)
+
+
+def test_interval_capped():
+    planner = heartbeat.HeartbeatPlanner(1000, lambda: 10 ** 6)
+    for _ in range(100):
+        planner.plan(10 ** 6)
+    assert planner.interval == heartbeat.MAX_INTERVAL
+    assert planner.min_timeout() == heartbeat.MAX_INTERVAL * heartbeat.TIMEOUT_FACTOR
+
+
+def test_interval_changes_gradually():
+    planner = heartbeat.HeartbeatPlanner(1000, lambda: 0)
+    assert planner.plan(60000) == heartbeat.MIN_INTERVAL * heartbeat.MAX_STEP
+    planner.interval = heartbeat.MAX_INTERVAL
+    assert planner.plan(0) == heartbeat.MAX_INTERVAL / heartbeat.MAX_STEP
+
+
+def test_next_interval_jittered():
+    planner = heartbeat.HeartbeatPlanner(1000, lambda: 0)
+    samples = {planner.next_interval() for _ in range(100)}
+    assert len(samples) > 1
+    assert all(abs(sample - planner.interval) <= planner.interval * heartbeat.JITTER for sample in samples)
+
+
+def test_timeout_floor_matches_planner():
+    planner = heartbeat.HeartbeatPlanner(1000.0, lambda: 0)
+    assert planner.min_timeout() == heartbeat.MIN_TIMEOUT
+    assert store.DEFAULT_TIMEOUT == models.MIN_REPORT_TIMEOUT == datetime.timedelta(seconds=planner.min_timeout())
+    with pytest.raises(pydantic.ValidationError):
+        schemas.GameServerReport(state=common.GameServerStateEnum.RUNNING, timeout=heartbeat.MIN_TIMEOUT - 1)
+    report = schemas.GameServerReport(state=common.GameServerStateEnum.RUNNING, timeout=heartbeat.MIN_TIMEOUT)
+    assert crud._timeout(report) == models.MIN_REPORT_TIMEOUT
@@ -0,0 +1,162 @@
+import asyncio
+import datetime
+import math
+import struct
+
+import pytest
+
+from game_server import crud as game_server_crud
+from game_server import schemas as game_server_schemas
+from game_server.status import common, listener, models, protocol, schemas
+
+
+def _report(**kwargs) -> schemas.GameServerReport:
+    fields = dict(state=common.GameServerStateEnum.RUNNING, player_count=3, max_player_count=20,
+                  timeout=datetime.timedelta(seconds=30), game_time=datetime.datetime(2024, 5, 1, 12, 30),
+                  day_length=datetime.timedelta(minutes=10), night_length=datetime.timedelta(minutes=5))
+    fields.update(kwargs)
+    return schemas.GameServerReport.model_validate(fields)
+
+
+def _tampered(game_server_id: int, offset: int, fmt: str, value) -> bytes:
+    """A frame with one field replaced and signed again, as a game server with a bug would send it."""
+    frame = bytearray(protocol.encode_report(game_server_id, _report()))
+    struct.pack_into(fmt, frame, offset, value)
+    signed = bytes(frame[protocol.SIGNED])
+    return signed + protocol._mac(game_server_id, signed)
+
+
+def test_round_trip():
+    report = _report()
+    game_server_id, decoded = protocol.decode_report(protocol.encode_report(42, report))
+    assert game_server_id == 42
+    assert decoded.model_dump() == report.model_dump()
+
+
+def test_round_trip_without_optional_fields():
+    report = schemas.GameServerReport(state=common.GameServerStateEnum.MAINTENANCE, player_count=0)
+    _, decoded = protocol.decode_report(protocol.encode_report(1, report))
+    assert decoded.model_dump() == report.model_dump()
+
+
+def test_frame_size():
+    assert protocol.FRAME.size == 51
+    assert len(protocol.encode_report(1, _report())) == protocol.FRAME.size
+
+
+def test_bad_mac():
+    frame = bytearray(protocol.encode_report(7, _report()))
+    frame[-1] ^= 1
+    with pytest.raises(protocol.BadMac) as e:
+        protocol.decode_report(bytes(frame))
+    assert e.value.game_server_id == 7
+
+
+def test_frame_of_another_server_is_rejected():
+    frame = bytearray(protocol.encode_report(7, _report()))
+    struct.pack_into("!I", frame, 3, 8)
+    with pytest.raises(protocol.BadMac):
+        protocol.decode_report(bytes(frame))
+
+
+@pytest.mark.parametrize("frame", [
+    b"",
+    b"R3" + bytes(100),
+    b"XX" + protocol.encode_report(1, _report())[2:],
+    protocol.encode_report(1, _report())[:2] + b"\x01" + protocol.encode_report(1, _report())[3:],
+])
+def test_malformed(frame):
+    with pytest.raises(protocol.BadFrame):
+        protocol.decode_report(frame)
+
+
+@pytest.mark.parametrize("offset, fmt, value", [
+    (7, "!B", len(common.STATE_CODES)),
+    (9, "!I", models.MAX_PLAYER_COUNT + 1),
+    (13, "!I", models.MAX_PLAYER_COUNT + 1),
+    (17, "!H", 1),
+    (17, "!H", 3600),
+    (19, "!q", 2 ** 62),
+    (27, "!f", math.nan),
+    (31, "!f", math.inf),
+    (27, "!f", 0.01),
+])
+def test_out_of_range(offset, fmt, value):
+    with pytest.raises(protocol.BadFrame):
+        protocol.decode_report(_tampered(1, offset, fmt, value))
+
+
+def test_report_key_is_shown_to_admins():
+    assert "report_key" in game_server_schemas.GameServerReadAdmin.model_json_schema(mode="serialization")["properties"]
+    assert "report_key" not in game_server_schemas.GameServerRead.model_json_schema(mode="serialization")["properties"]
+
+
+class _Transport:
+    def __init__(self):
+        self.sent = []
+
+    def sendto(self, data: bytes, addr: tuple) -> None:
+        self.sent.append((data, addr))
+
+
+@pytest.fixture
+def datagram(monkeypatch):
+    reported = []
+    monkeypatch.setattr(listener.crud, "report_server_status", lambda *args: reported.append(args))
+    datagram = listener.ReportDatagramProtocol()
+    datagram.connection_made(_Transport())
+    datagram.reported = reported
+    return datagram
+
+
+def test_udp_acks_only_authenticated_frames(datagram, monkeypatch):
+    monkeypatch.setitem(game_server_crud.reporter_host_cache, 1, (True, "10.0.0.1", math.inf))
+    frame = protocol.encode_report(1, _report())
+    datagram.datagram_received(frame, ("10.0.0.1", 9))
+    datagram.datagram_received(frame[:-1] + bytes([frame[-1] ^ 1]), ("10.0.0.1", 9))
+    datagram.datagram_received(b"garbage", ("10.0.0.1", 9))
+    datagram.datagram_received(frame, ("10.0.0.2", 9))
+    assert datagram.transport.sent == [(protocol.encode_ack(1, protocol.Result.OK), ("10.0.0.1", 9))]
+    assert len(datagram.reported) == 1
+
+
+def test_udp_bounds_uncached_lookups(datagram, monkeypatch):
+    lookups = []
+
+    async def get_reporter_host(game_server_id):
+        lookups.append(game_server_id)
+        await asyncio.sleep(3600)
+
+    monkeypatch.setattr(game_server_crud, "get_reporter_host", get_reporter_host)
+
+    async def flood():
+        for game_server_id in range(1000, 1000 + 10 * listener.MAX_UNCACHED_IN_FLIGHT):
+            datagram.datagram_received(protocol.encode_report(game_server_id, _report()),
+                                       (f"10.1.{game_server_id // 256 % 256}.{game_server_id % 256}", 9))
+        await asyncio.sleep(0)
+        in_flight = len(datagram._tasks)
+        for task in list(datagram._tasks):
+            task.cancel()
+        return in_flight
+
+    assert asyncio.run(flood()) == listener.MAX_UNCACHED_IN_FLIGHT
+    assert len(lookups) == listener.MAX_UNCACHED_IN_FLIGHT
+
+
+def test_udp_rate_limits_lookups_per_host(datagram, monkeypatch):
+    monkeypatch.setattr(listener.universal.config.settings, "GAME_SERVER_REPORT_LOOKUP_BURST", 5.0)
+
+    async def get_reporter_host(game_server_id):
+        return False, None
+
+    monkeypatch.setattr(game_server_crud, "get_reporter_host", get_reporter_host)
+
+    async def flood():
+        for game_server_id in range(2000, 2020):
+            datagram.datagram_received(protocol.encode_report(game_server_id, _report()), ("10.2.0.1", 9))
+        started = len(datagram._tasks)
+        await asyncio.gather(*datagram._tasks)
+        return started
+
+    assert asyncio.run(flood()) == 5
+    assert datagram.transport.sent == []
@@ -0,0 +1,99 @@
+import asyncio
+import datetime
+import fcntl
+
+import pytest
+
+from game_server.status import aggregates, common, crud, models, ranking, snapshot, store
+
+RUNNING = common.GameServerStateEnum.RUNNING
+
+
+def _status(seconds_ago: float = 0, **kwargs) -> models.GameServerStatus:
+    fields = dict(state=RUNNING, player_count=3, max_player_count=10,
+                  last_updated=datetime.datetime.now() - datetime.timedelta(seconds=seconds_ago))
+    return models.GameServerStatus(**fields | kwargs)
+
+
+def test_round_trip(tmp_path):
+    path = tmp_path / "snapshot.json"
+    statuses = [
+        (1, _status(game_time=datetime.datetime(2024, 1, 1, 6), day_length=datetime.timedelta(minutes=10),
+                    night_length=datetime.timedelta(minutes=5), timeout=datetime.timedelta(seconds=30),
+                    detail="地图：校园")),
+        (2, _status(max_player_count=None)),
+    ]
+    snapshot.write(path, snapshot.encode(statuses, {1: 5, 2: 9, 3: 11}))
+    read_statuses, generations = snapshot.read(path)
+    assert read_statuses == dict(statuses)
+    assert generations == {1: 5, 2: 9, 3: 11}
+    assert list(tmp_path.iterdir()) == [path]
+
+
+@pytest.mark.parametrize("content", [None, b"", b"{not json", b'{"version": 0, "statuses": {}, "generations": {}}'])
+def test_unusable_snapshot_is_empty(tmp_path, content):
+    path = tmp_path / "snapshot.json"
+    if content is not None:
+        path.write_bytes(content)
+    assert snapshot.read(path) == ({}, {})
+
+
+def test_invalid_status_is_skipped(tmp_path):
+    path = tmp_path / "snapshot.json"
+    path.write_bytes(b'{"version": 1, "statuses": {"1": {"state": "unknown"}, "2": {"state": "running"}}, '
+                     b'"generations": {}}')
+    assert list(snapshot.read(path)[0]) == [2]
+
+
+def test_only_one_writer(tmp_path, monkeypatch):
+    monkeypatch.setattr(snapshot, "_lock_file", None)
+    path = tmp_path / "snapshot.json"
+    assert snapshot.is_writer(path)
+    try:
+        with open(tmp_path / "snapshot.json.lock", "w") as other_worker:
+            with pytest.raises(BlockingIOError):
+                fcntl.flock(other_worker, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    finally:
+        snapshot._lock_file.close()
+
+
+@pytest.fixture
+def worker(tmp_path, monkeypatch):
+    """A worker with a memory store that saves its snapshot under ``tmp_path``."""
+    monkeypatch.setattr(snapshot, "_lock_file", None)
+    monkeypatch.setattr(crud.universal.config.settings, "GAME_SERVER_STATUS_SNAPSHOT_PATH", tmp_path / "snap.json")
+
+    def restart():
+        monkeypatch.setattr(crud, "status_store", store.MemoryStatusStore())
+        monkeypatch.setattr(crud, "load_index", ranking.LoadIndex())
+        monkeypatch.setattr(crud, "status_aggregates", aggregates.StatusAggregates())
+
+    restart()
+    yield restart
+    if snapshot._lock_file is not None:
+        snapshot._lock_file.close()
+
+
+def test_restart_restores_statuses(worker):
+    crud.status_store.put(1, _status())
+    crud.status_store.put(2, _status(seconds_ago=3600))
+    generation = crud.status_store.bump_generation(1)
+    asyncio.run(crud.save_snapshot())
+
+    worker()
+    assert crud.restore_snapshot() == 1
+    assert crud.get_server_status(1).state == RUNNING
+    assert 2 not in crud.status_store
+    assert crud.get_server_generations([1]) == {1: generation}
+    assert crud.get_recommended_server_ids(0, 10) == [1]
+    assert crud.get_stats().server_count == 1
+
+
+def test_restore_keeps_newer_statuses(worker):
+    crud.status_store.put(1, _status())
+    asyncio.run(crud.save_snapshot())
+
+    worker()
+    crud.status_store.put(1, _status(player_count=8))
+    assert crud.restore_snapshot() == 0
+    assert crud.get_server_status(1).player_count == 8
@@ -0,0 +1,56 @@
+import asyncio
+
+import pytest
+
+from game_server.status import aggregates, common, crud, events, history, ranking, schemas, store, waiters
+
+RUNNING = common.GameServerStateEnum.RUNNING
+
+
+@pytest.fixture(autouse=True)
+def fresh_state(monkeypatch):
+    """A worker with a memory store and nothing reported yet."""
+    monkeypatch.setattr(crud, "status_store", store.MemoryStatusStore())
+    monkeypatch.setattr(crud, "broadcaster", events.StatusBroadcaster())
+    monkeypatch.setattr(crud, "history_store", history.HistoryStore())
+    monkeypatch.setattr(crud, "load_index", ranking.LoadIndex())
+    monkeypatch.setattr(crud, "status_aggregates", aggregates.StatusAggregates())
+    monkeypatch.setattr(crud, "generation_waiters", waiters.GenerationWaiters())
+
+
+def _report(player_count: int = 1) -> schemas.GameServerReport:
+    return schemas.GameServerReport(state=RUNNING, player_count=player_count, max_player_count=10)
+
+
+def test_forget_server_drops_everything():
+    crud.set_admin(1, "a")
+    crud.report_server_status(1, _report())
+    crud.broadcaster.flush()
+
+    crud.forget_server(1)
+
+    assert 1 not in crud.status_store
+    assert crud.status_store.all_generations() == {}
+    assert crud.history_store.get(1) is None
+    assert crud.get_recommended_server_ids(0, 10) == []
+    assert crud.get_stats().server_count == 0 and crud.get_stats().admins == {}
+    assert crud.broadcaster._pending[1]["state"] == common.GameServerStateEnum.STOPPED
+
+
+def test_forget_server_wakes_waiters():
+    crud.report_server_status(1, _report())
+
+    async def wait_for_delete():
+        waiting = asyncio.create_task(crud.wait_server_status(1, 10 ** 9, 5))
+        await asyncio.sleep(0)
+        crud.forget_server(1)
+        return await asyncio.wait_for(waiting, 1)
+
+    assert asyncio.run(wait_for_delete()).status.state == common.GameServerStateEnum.STOPPED
+
+
+def test_expiry_after_delete_does_not_recreate_history():
+    crud.report_server_status(1, _report())
+    crud.history_store.remove(1)
+    crud._on_stopped(1)
+    assert crud.history_store.get(1) is None
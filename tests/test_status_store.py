@@ -0,0 +1,96 @@
+import datetime
+from typing import Optional
+
+import pytest
+
+from game_server.status import aggregates, common, models, ranking, store
+
+RUNNING = common.GameServerStateEnum.RUNNING
+MAINTENANCE = common.GameServerStateEnum.MAINTENANCE
+
+
+def _status(state: common.GameServerStateEnum, player_count: int, max_player_count: Optional[int] = 10,
+            seconds_ago: float = 0) -> models.GameServerStatus:
+    return models.GameServerStatus(state=state, player_count=player_count, max_player_count=max_player_count,
+                                   last_updated=datetime.datetime.now() - datetime.timedelta(seconds=seconds_ago))
+
+
+@pytest.fixture
+def sqlite_store(tmp_path) -> store.SQLiteStatusStore:
+    return store.SQLiteStatusStore(tmp_path / "status.sqlite3")
+
+
+def _expected(statuses: dict[int, models.GameServerStatus], admin_ids: dict[int, str]):
+    """
+    What ``StatusAggregates`` and ``LoadIndex`` give for the same statuses.
+    """
+    totals = aggregates.StatusAggregates()
+    index = ranking.LoadIndex()
+    for game_server_id, admin_id in admin_ids.items():
+        totals.set_admin(game_server_id, admin_id)
+    for game_server_id, status in statuses.items():
+        totals.update(game_server_id, status)
+        index.update(game_server_id, status)
+    states = {state: (count, 0) for state, count in totals.state_counts.items() if count}
+    return states, {admin_id: tuple(value) for admin_id, value in totals.admins.items()}, index.slice(0, 100)
+
+
+def test_totals_follow_puts(sqlite_store):
+    sqlite_store.set_admin(1, "a")
+    sqlite_store.put(1, _status(RUNNING, 3))
+    sqlite_store.put(2, _status(RUNNING, 4))
+    sqlite_store.put(1, _status(RUNNING, 5))
+    sqlite_store.put_many({3: _status(MAINTENANCE, 2), 4: _status(RUNNING, 10)})
+    states, admins = sqlite_store.totals()
+    assert states == {RUNNING: (3, 19), MAINTENANCE: (1, 2)}
+    assert admins == {"a": (1, 5)}
+
+
+def test_set_admin_moves_a_reporting_server(sqlite_store):
+    sqlite_store.put(1, _status(RUNNING, 3))
+    sqlite_store.set_admin(1, "a")
+    assert sqlite_store.totals()[1] == {"a": (1, 3)}
+    sqlite_store.set_admin(1, "b")
+    assert sqlite_store.totals()[1] == {"b": (1, 3)}
+    sqlite_store.set_admin(1, None)
+    assert sqlite_store.totals()[1] == {}
+
+
+def test_totals_follow_removal_and_expiry(sqlite_store):
+    sqlite_store.set_admin(1, "a")
+    sqlite_store.put(1, _status(RUNNING, 3))
+    sqlite_store.put(2, _status(RUNNING, 4, seconds_ago=3600))
+    assert sqlite_store.expire() == [2]
+    assert sqlite_store.totals() == ({RUNNING: (1, 3)}, {"a": (1, 3)})
+    sqlite_store.forget(1)
+    assert sqlite_store.totals() == ({}, {})
+    assert 1 not in sqlite_store
+
+
+def test_totals_and_ranking_match_memory(sqlite_store):
+    statuses = {
+        1: _status(RUNNING, 3),
+        2: _status(RUNNING, 9),
+        3: _status(RUNNING, 10),
+        4: _status(MAINTENANCE, 1),
+        5: _status(RUNNING, 1, max_player_count=None),
+        6: _status(RUNNING, 0),
+    }
+    admin_ids = {1: "a", 2: "a", 4: "b"}
+    for game_server_id, admin_id in admin_ids.items():
+        sqlite_store.set_admin(game_server_id, admin_id)
+    sqlite_store.put_many(statuses)
+    states, admins, ranked = _expected(statuses, admin_ids)
+    assert {state: count for state, (count, _) in sqlite_store.totals()[0].items()} == \
+           {state: count for state, (count, _) in states.items()}
+    assert sqlite_store.totals()[1] == admins
+    assert sqlite_store.ranked_ids(0, 100) == ranked
+    assert sqlite_store.ranked_ids(1, 3) == ranked[1:3]
+
+
+def test_restore_fills_totals(sqlite_store):
+    sqlite_store.set_admin(1, "a")
+    assert sqlite_store.restore({1: _status(RUNNING, 3)}, {1: 7}) == [1]
+    assert sqlite_store.totals() == ({RUNNING: (1, 3)}, {"a": (1, 3)})
+    assert sqlite_store.ranked_ids(0, 10) == [1]
+    assert sqlite_store.get_generations([1]) == {1: 7}
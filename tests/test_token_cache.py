@@ -0,0 +1,91 @@
+import uuid
+
+import pytest
+
+HEADERS = {"User-Agent": "pytest"}
+
+
+def _register_and_login(client, password: str = "secret") -> tuple[str, str]:
+    username = "u" + uuid.uuid4().hex[:12]
+    response = client.post("/user/register", json={"username": username, "password": password})
+    assert response.status_code == 201, response.text
+    response = client.post("/auth/login", json={"username": username, "password": password})
+    assert response.status_code == 200, response.text
+    return username, response.json()["access_token"]
+
+
+def _auth(token: str) -> dict[str, str]:
+    return {"Authorization": f"Bearer {token}"}
+
+
+def test_cache_hit_after_first_request(client):
+    from user.token_cache import token_cache
+
+    _, token = _register_and_login(client)
+    assert token_cache.get(token) is None
+    assert client.get("/user/me", headers=_auth(token)).status_code == 200
+    assert token_cache.get(token) is not None
+
+
+def test_change_password_with_warm_cache(client):
+    from user.token_cache import token_cache
+
+    username, token = _register_and_login(client, "old-password")
+    assert client.get("/user/me", headers=_auth(token)).status_code == 200
+    assert token_cache.get(token) is not None
+    response = client.post("/auth/change-password", headers=_auth(token),
+                           json={"old_password": "old-password", "new_password": "new-password"})
+    assert response.status_code == 204, response.text
+    # 修改用户会清除缓存
+    assert token_cache.get(token) is None
+    assert client.post("/auth/login", json={"username": username, "password": "old-password"}).status_code == 400
+    assert client.post("/auth/login", json={"username": username, "password": "new-password"}).status_code == 200
+
+
+def test_update_with_warm_cache_bumps_version(client):
+    _, token = _register_and_login(client)
+    first = client.get("/user/me", headers=_auth(token))
+    etag = first.headers.get("ETag")
+    response = client.patch("/auth/me", headers=_auth(token), json={"email": "a" + uuid.uuid4().hex[:8] + "@example.com"})
+    assert response.status_code == 200, response.text
+    second = client.get("/user/me", headers=_auth(token))
+    assert second.status_code == 200
+    if etag is not None:
+        assert second.headers.get("ETag") != etag
+
+
+def test_logout_invalidates_cached_token(client):
+    _, token = _register_and_login(client)
+    assert client.get("/user/me", headers=_auth(token)).status_code == 200
+    assert client.post("/auth/logout", headers=_auth(token)).status_code == 204
+    assert client.get("/user/me", headers=_auth(token)).status_code == 401
+
+
+def test_unique_login_invalidates_other_tokens(client):
+    username, token = _register_and_login(client)
+    assert client.get("/user/me", headers=_auth(token)).status_code == 200
+    response = client.post("/auth/login", json={"username": username, "password": "secret", "unique": True})
+    assert response.status_code == 200
+    assert client.get("/user/me", headers=_auth(token)).status_code == 401
+    assert client.get("/user/me", headers=_auth(response.json()["access_token"])).status_code == 200
+
+
+@pytest.mark.parametrize("ttl", [0.0])
+def test_cache_disabled_with_zero_ttl(ttl):
+    from user.token_cache import TokenCache
+
+    cache = TokenCache(ttl=ttl)
+    cache.put("token", "user", {"id": "user"})
+    assert cache.get("token") is None
+
+
+def test_invalidate_user_drops_every_token():
+    from user.token_cache import TokenCache
+
+    cache = TokenCache()
+    cache.put("a", "user", {"id": "user"})
+    cache.put("b", "user", {"id": "user"})
+    cache.put("c", "other", {"id": "other"})
+    cache.invalidate_user("user")
+    assert cache.get("a") is None and cache.get("b") is None
+    assert cache.get("c") == {"id": "other"}
@@ -0,0 +1,64 @@
+import asyncio
+
+import pytest
+import sqlalchemy
+import sqlalchemy.dialects.sqlite
+import sqlmodel
+
+from user import db
+
+
+class _Captured(Exception):
+    pass
+
+
+class _RecordingSession:
+    """Keeps the statement instead of running it."""
+
+    def __init__(self):
+        self.statements = []
+
+    async def execute(self, statement):
+        self.statements.append(statement)
+        raise _Captured()
+
+
+def _statement(lookup: str, identifier: str):
+    session = _RecordingSession()
+    user_db = db.UserDatabase(session, db.User)
+    with pytest.raises(_Captured):
+        asyncio.run(getattr(user_db, lookup)(identifier))
+    assert len(session.statements) == 1, "the lookup should be a single query"
+    return session.statements[0]
+
+
+@pytest.fixture(scope="module")
+def engine():
+    engine = sqlalchemy.create_engine("sqlite://")
+    sqlmodel.SQLModel.metadata.create_all(engine)
+    return engine
+
+
+def _plan(engine, statement) -> str:
+    sql = statement.compile(dialect=sqlalchemy.dialects.sqlite.dialect(), compile_kwargs={"literal_binds": True})
+    with engine.connect() as connection:
+        rows = connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}").fetchall()
+    return "\n".join(row[-1] for row in rows)
+
+
+@pytest.mark.parametrize("lookup, identifier, indexes", [
+    ("get_by_username", "Alice", ["ix_user_username_lower"]),
+    ("get_by_email", "Alice@Example.com", ["ix_user_email_lower"]),
+    ("get_by_any_identifier", "Alice", ["ix_user_username_lower"]),
+    ("get_by_any_identifier", "alice@example.com", ["ix_user_email_lower"]),
+    ("get_by_any_identifier", "13800138000", ["ix_user_username_lower", "ix_user_phone_no"]),
+])
+def test_lookup_is_an_index_seek(engine, lookup, identifier, indexes):
+    """
+    SQLite supports the same expression indexes as MySQL 8.0.13+, so its plan shows whether ``lower(column)``
+    matches them. The plan must use every index and never scan the table.
+    """
+    plan = _plan(engine, _statement(lookup, identifier))
+    assert "SCAN" not in plan, plan
+    for index in indexes:
+        assert index in plan, plan